@@ -1,4 +1,19 @@
 """Data Abstractions"""
+from __future__ import annotations
+from array import array
+from sys import intern
+from typing import Optional
+
+# The four kinds of review. Review types are interned, so every review of
+# a kind shares one string and type comparisons are usually identity checks.
+COSMETIC = 'COSMETIC'
+MODERATE_RISK = 'MODERATE RISK'
+HIGH_RISK = 'HIGH RISK'
+OVERALL = 'OVERALL'
+RATING_TYPES = [COSMETIC, MODERATE_RISK, HIGH_RISK, OVERALL]
+APARTMENT_TYPES = ['TCHC', 'PRIVATE', 'SOCIAL HOUSING']
+# the ApartmentBuilding slot that holds the rating of each type in RATING_TYPES
+_RATING_SLOTS = {COSMETIC: '_cosmetic', MODERATE_RISK: '_moderate_risk', HIGH_RISK: '_high_risk', OVERALL: '_overall'}
 
 #############################
 # Phase 1: Data Abstractions #
@@ -14,12 +29,13 @@ class Review:
     -- an overall review, which includes many features and ranges from 0 to 100
        the '_rating_type' for this kind of review is 'OVERALL'.
     """
+    __slots__ = ('_rating_type', '_rating')
     _rating_type: str
     _rating: float
 
     def __init__(self, rating_type: str, rating: float) -> None:
         """Return a Review abstraction."""
-        self._rating_type = rating_type
+        self._rating_type = intern(rating_type)
         self._rating = rating
 
     @property
@@ -49,7 +65,15 @@ class ApartmentBuilding:
     _type: str
     _ward: int
     _year: int
+    __slots__ = ('_type', '_ward', '_year', '_reviews', '_cosmetic', '_moderate_risk', '_high_risk', '_overall',
+                 '_min_index', '_indexed')
     _reviews: list[Review]
+    _cosmetic: Optional[float]
+    _moderate_risk: Optional[float]
+    _high_risk: Optional[float]
+    _overall: Optional[float]
+    _min_index: int
+    _indexed: int
 
     def __init__(self, type: str, ward: int, year: int, reviews: list[Review]) -> None:
         """Return an apartment abstraction.
@@ -71,6 +95,56 @@ class ApartmentBuilding:
         self._ward = ward
         self._year = year
         self._reviews = reviews
+        # the rating of the first review of each type in RATING_TYPES, or None
+        self._cosmetic = self._moderate_risk = self._high_risk = self._overall = None
+        self._min_index = -1  # position of the first review with the lowest rating
+        self._indexed = 0  # number of reviews, from the front of the list, in the index
+
+    def _index_ratings(self) -> None:
+        """Bring the index of ratings up to date with any reviews that have been added to
+        the reviews list since it was last used. The index is held in fixed slots, so
+        reading it allocates nothing; reviews of other types are found by `apartment_rating`
+        with a scan of the list.
+        Only reviews appended to the end of the list are picked up, and a shorter list
+        makes the index start again. Replacing a review in place, or removing one and
+        then adding another, is not noticed; see `reviews`.
+        """
+        reviews = self._reviews
+        if self._indexed > len(reviews):  # reviews were removed, so start again
+            self._cosmetic = self._moderate_risk = self._high_risk = self._overall = None
+            self._min_index = -1
+            self._indexed = 0
+
+        while self._indexed < len(reviews):
+            r = reviews[self._indexed]
+            t = r.type
+            if t == COSMETIC:
+                if self._cosmetic is None:
+                    self._cosmetic = r.rating
+            elif t == OVERALL:
+                if self._overall is None:
+                    self._overall = r.rating
+            elif t == MODERATE_RISK:
+                if self._moderate_risk is None:
+                    self._moderate_risk = r.rating
+            elif t == HIGH_RISK:
+                if self._high_risk is None:
+                    self._high_risk = r.rating
+            if self._min_index < 0 or r.rating < reviews[self._min_index].rating:
+                self._min_index = self._indexed
+            self._indexed += 1
+
+    def add_review(self, review: Review) -> None:
+        """Add `review` to the reviews of the apartment building.
+        >>> a = ApartmentBuilding('PRIVATE', 1, 2000, [Review('COSMETIC', 10)])
+        >>> a.apartment_overall_rating()
+        0
+        >>> a.add_review(Review('OVERALL', 75))
+        >>> a.apartment_overall_rating(), a.num_ratings()
+        (75, 2)
+        """
+        assert isinstance(review, Review), "review must be a Review"
+        self._reviews.append(review)
 
     @property
     def type(self) -> str:
@@ -82,10 +156,14 @@ class ApartmentBuilding:
 
     @property
     def year(self) -> int:
-        return self.year
+        return self._year
 
     @property
     def reviews(self) -> list[Review]:
+        """Return the list of reviews of the apartment building. Reviews may be appended to
+        this list (or added with `add_review`), but it must not otherwise be changed in
+        place: the ratings index only tracks reviews added to the end of the list.
+        """
         return self._reviews
 
     def get_all_ratings(self) -> list[float]:
@@ -110,19 +188,30 @@ class ApartmentBuilding:
         >>> ApartmentBuilding('SOCIAL HOUSING', 1, 1973, [Review('MODERATE RISK', 6), Review('COSMETIC', 11), Review('OVERALL', 86)]).apartment_min_rating()
         ('MODERATE RISK', 6)
         >>> ApartmentBuilding('PRIVATE', 1, 2000, []).apartment_min_rating()
+        >>> ApartmentBuilding('PRIVATE', 1, 2000, [Review('COSMETIC', 2), Review('OVERALL', 2)]).apartment_min_rating()
+        ('COSMETIC', 2)
         """
-        if len(self.reviews) == 0: 
+        self._index_ratings()
+        if self._min_index < 0:
             return None
-        
-        # placeholder
-        min_rating = (None, max([r.rating for r in self.reviews]))
-
-        # find the review with the min rating
-        for r in self.reviews: 
-            if r._rating < min_rating[1]:
-                min_rating = (r.type, r.rating)
+        r = self._reviews[self._min_index]
+        return (r.type, r.rating)
 
-        return min_rating
+    def apartment_rating(self, rating_type: str) -> float:
+        """Return the rating of the given type for the apartment building.
+        If the building has no review of that type, return zero.
+        >>> ApartmentBuilding('SOCIAL HOUSING', 1, 1973, [Review('MODERATE RISK', 6), Review('COSMETIC', 11), Review('OVERALL', 86)]).apartment_rating('MODERATE RISK')
+        6
+        >>> ApartmentBuilding('SOCIAL HOUSING', 1, 1973, [Review('MODERATE RISK', 6)]).apartment_rating('HIGH RISK')
+        0
+        >>> ApartmentBuilding('SOCIAL HOUSING', 1, 1973, [Review('APT_LOG', 6), Review('APT_LOG', 7)]).apartment_rating('APT_LOG')
+        6
+        """
+        if rating_type not in _RATING_SLOTS:
+            return next((r.rating for r in self._reviews if r.type == rating_type), 0)
+        self._index_ratings()
+        rating = getattr(self, _RATING_SLOTS[rating_type])
+        return 0 if rating is None else rating
 
     def apartment_overall_rating(self) -> float:
         """Return the overall rating for the apartment building.
@@ -134,12 +223,8 @@ class ApartmentBuilding:
         >>> ApartmentBuilding('PRIVATE', 1, 2000, [Review('MODERATE RISK', 10), Review('COSMETIC', 10)]).apartment_overall_rating()
         0
         """
-        if len(self.reviews) == 0 or ("OVERALL" not in [r.type for r in self.reviews]): 
-            return 0
-        
-        for r in self.reviews:
-            if r.type == "OVERALL":
-                return r.rating
+        self._index_ratings()
+        return 0 if self._overall is None else self._overall
 
     def apartment_cosmetic_rating(self) -> float:
         """Return the cosmetic rating for the apartment building.
@@ -150,13 +235,262 @@ class ApartmentBuilding:
         0
         >>> ApartmentBuilding('PRIVATE', 1, 2000, [Review('MODERATE RISK', 10), Review('OVERALL', 10)]).apartment_cosmetic_rating()
         0
+        >>> a = ApartmentBuilding('PRIVATE', 1, 2000, [])
+        >>> a.reviews.append(Review('COSMETIC', 2.5))
+        >>> a.apartment_cosmetic_rating()
+        2.5
+        """
+        self._index_ratings()
+        return 0 if self._cosmetic is None else self._cosmetic
+
+
+# Apartment tables
+class ApartmentTable:
+    """A compact, column-oriented collection of apartment buildings.
+    Each rating type is stored in its own array of floats, and the type, ward and year of
+    every building are stored in arrays of small integers, so a table costs a few dozen bytes
+    per building instead of one ApartmentBuilding and four Review objects.
+    Every row has all four ratings; a rating that is missing is stored as zero, which is
+    what the rating methods of ApartmentBuilding return for it.
+    Indexing or iterating over a table gives ApartmentRow views of its rows. Slicing a table
+    copies the rows into a new table, whose rows are still equal to the rows they were
+    copied from until the new table is pickled.
+    >>> t = ApartmentTable()
+    >>> t.append('PRIVATE', 4, 1990, 2.5, 2.0, 1.5, 80)
+    >>> t.append('TCHC', 9, 1965, 1.0, 3.0, 2.0, 60)
+    >>> len(t)
+    2
+    >>> t.column('OVERALL').tolist()
+    [80.0, 60.0]
+    >>> t[1].type, t[1].ward, t[1].year, t[1].apartment_cosmetic_rating()
+    ('TCHC', 9, 1965, 1.0)
+    """
+    _types: array
+    _wards: array
+    _years: array
+    _ratings: dict[str, array]
+    _origin: Optional[ApartmentTable]
+    _rows: Optional[range]
+
+    def __init__(self) -> None:
+        """Return an empty ApartmentTable."""
+        self._types = array('b')  # index into APARTMENT_TYPES
+        self._wards = array('i')
+        self._years = array('i')
+        self._ratings = {t: array('d') for t in RATING_TYPES}  # one column per rating type
+        self._origin = None  # the table this one was sliced from, if any
+        self._rows = None  # the positions in _origin of this table's rows
+
+    def __getstate__(self) -> dict:
+        """Pickle only the columns; an unpickled table is not a slice of any other."""
+        state = self.__dict__.copy()
+        state['_origin'] = state['_rows'] = None
+        return state
+
+    @staticmethod
+    def from_columns(types: list[str], wards, years, cosmetic, moderate, high, overall) -> ApartmentTable:
+        """Return an ApartmentTable built from whole columns at once. `types` holds the type
+        names of the buildings and the other columns hold numbers; all must be the same length.
+        >>> t = ApartmentTable.from_columns(['PRIVATE', 'TCHC'], [4, 9], [1990, 1965], [2.5, 1.0], [2.0, 3.0], [1.5, 2.0], [80, 60])
+        >>> t[1].type, t[1].ward, t.column('OVERALL').tolist()
+        ('TCHC', 9, [80.0, 60.0])
+        """
+        table = ApartmentTable()
+        codes = {t: i for i, t in enumerate(APARTMENT_TYPES)}
+        table._types = array('b', map(codes.__getitem__, types))
+        table._wards = array('i', wards)
+        table._years = array('i', years)
+        for t, column in zip(RATING_TYPES, (cosmetic, moderate, high, overall)):
+            table._ratings[t] = array('d', column)
+        assert all(len(column) == len(table._types) for column in table._arrays()), "columns must all be the same length"
+        return table
+
+    @staticmethod
+    def from_buffers(type_codes, wards, years, cosmetic, moderate, high, overall) -> ApartmentTable:
+        """Return an ApartmentTable whose columns are copied from contiguous buffers that are
+        already in the machine format of each column: signed bytes for the positions of the
+        types in APARTMENT_TYPES, C ints for the wards and years, and C doubles for the
+        ratings (for example, NumPy arrays of dtype int8, intc and float64).
+        >>> t = ApartmentTable.from_buffers(array('b', [1, 0]), array('i', [4, 9]), array('i', [1990, 1965]), array('d', [2.5, 1.0]), array('d', [2.0, 3.0]), array('d', [1.5, 2.0]), array('d', [80, 60]))
+        >>> t[1].type, t[1].ward, t.column('OVERALL').tolist()
+        ('TCHC', 9, [80.0, 60.0])
+        """
+        table = ApartmentTable()
+        for column, buffer in zip(table._arrays(), (type_codes, wards, years, cosmetic, moderate, high, overall)):
+            column.frombytes(memoryview(buffer).cast('B'))
+        assert all(len(column) == len(table._types) for column in table._arrays()), "columns must all be the same length"
+        return table
+
+    @staticmethod
+    def from_apartments(apartments: list[ApartmentBuilding]) -> ApartmentTable:
+        """Return an ApartmentTable holding the same data as `apartments`.
+        >>> a = ApartmentBuilding('SOCIAL HOUSING', 1, 1973, [Review('MODERATE RISK', 6), Review('COSMETIC', 11), Review('OVERALL', 86)])
+        >>> ApartmentTable.from_apartments([a])[0].reviews
+        [Review('COSMETIC', 11.0), Review('MODERATE RISK', 6.0), Review('HIGH RISK', 0.0), Review('OVERALL', 86.0)]
         """
-        if len(self.reviews) == 0 or ("COSMETIC" not in [r.type for r in self.reviews]): 
-            return 0
-        
-        for r in self.reviews:
-            if r.type == 'COSMETIC':
-                return r.rating
+        table = ApartmentTable()
+        for a in apartments:
+            ratings = {t: 0 for t in RATING_TYPES}
+            for r in a.reviews:
+                if r.type in ratings:
+                    ratings[r.type] = r.rating
+            table.append(a.type, a.ward, a.year, *[ratings[t] for t in RATING_TYPES])
+        return table
+
+    def append(self, type: str, ward: int, year: int, cosmetic: float, moderate: float, high: float, overall: float) -> None:
+        """Add a building to the end of the table."""
+        self._types.append(APARTMENT_TYPES.index(type))
+        self._wards.append(ward)
+        self._years.append(year)
+        for t, rating in zip(RATING_TYPES, (cosmetic, moderate, high, overall)):
+            self._ratings[t].append(rating)
+
+    def _arrays(self) -> list[array]:
+        """Return every column of the table, in the order they are written to files."""
+        return [self._types, self._wards, self._years] + [self._ratings[t] for t in RATING_TYPES]
+
+    def tofile(self, f) -> None:
+        """Write the columns of the table to the binary file `f`, in machine byte order."""
+        for column in self._arrays():
+            column.tofile(f)
+
+    @staticmethod
+    def fromfile(f, rows: int) -> ApartmentTable:
+        """Return a table of `rows` buildings read from the binary file `f`, which must have
+        been written by `tofile`.
+        >>> import io
+        >>> t = ApartmentTable()
+        >>> t.append('PRIVATE', 4, 1990, 2.5, 2.0, 1.5, 80)
+        >>> f = io.BytesIO()
+        >>> t.tofile(f)
+        >>> ApartmentTable.fromfile(io.BytesIO(f.getvalue()), 1)[0]
+        ApartmentRow('PRIVATE', 4, 1990, [Review('COSMETIC', 2.5), Review('MODERATE RISK', 2.0), Review('HIGH RISK', 1.5), Review('OVERALL', 80.0)])
+        """
+        table = ApartmentTable()
+        for column in table._arrays():
+            column.fromfile(f, rows)
+        return table
+
+    def column(self, rating_type: str) -> array:
+        """Return the array holding the `rating_type` rating of every building, in row order."""
+        return self._ratings[rating_type]
+
+    @property
+    def wards(self) -> array:
+        """Return the array holding the ward of every building, in row order."""
+        return self._wards
+
+    @property
+    def years(self) -> array:
+        """Return the array holding the year of construction of every building, in row order."""
+        return self._years
+
+    def __len__(self) -> int:
+        return len(self._types)
+
+    def __getitem__(self, i: int | slice) -> ApartmentRow | ApartmentTable:
+        """Return a view of row `i`, or a new table holding copies of the rows in slice `i`.
+        >>> t = ApartmentTable.from_columns(['PRIVATE', 'TCHC', 'PRIVATE'], [4, 9, 2], [1990, 1965, 2001], [2.5, 1.0, 3.0], [2.0, 3.0, 1.0], [1.5, 2.0, 2.5], [80, 60, 70])
+        >>> t[1:].wards.tolist(), t[1:][0].type, len(t[:0])
+        ([9, 2], 'TCHC', 0)
+        >>> t[1:][1] == t[2] == t[::2][1], t[1:][1] == t[1]
+        (True, False)
+        """
+        if isinstance(i, slice):
+            table = ApartmentTable()
+            table._types, table._wards, table._years = self._types[i], self._wards[i], self._years[i]
+            table._ratings = {t: column[i] for t, column in self._ratings.items()}
+            if self._origin is None:
+                table._origin, table._rows = self, range(len(self))[i]
+            else:
+                table._origin, table._rows = self._origin, self._rows[i]
+            return table
+        if not -len(self) <= i < len(self):
+            raise IndexError('table index out of range')
+        return ApartmentRow(self, i % len(self))
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield ApartmentRow(self, i)
+
+
+class ApartmentRow(ApartmentBuilding):
+    """A lightweight view of one row of an ApartmentTable that behaves like an ApartmentBuilding.
+    Its attributes are read from the table's columns when they are asked for.
+    Two views of the same row are equal.
+    """
+    __slots__ = ('_table', '_index')
+    _table: ApartmentTable
+    _index: int
+
+    def __init__(self, table: ApartmentTable, index: int) -> None:
+        """Return a view of row `index` of `table`."""
+        self._table = table
+        self._index = index
+
+    def __reduce__(self):
+        """Pickle the row as a view of a one-row copy of its table, rather than the whole table.
+        >>> import pickle
+        >>> t = ApartmentTable.from_columns(['PRIVATE', 'TCHC'], [4, 9], [1990, 1965], [2.5, 1.0], [2.0, 3.0], [1.5, 2.0], [80, 60])
+        >>> row = pickle.loads(pickle.dumps(t[1]))
+        >>> len(row._table), row.ward, row.apartment_overall_rating()
+        (1, 9, 60.0)
+        """
+        return ApartmentRow, (self._table[self._index:self._index + 1], 0)
+
+    @property
+    def type(self) -> str:
+        return APARTMENT_TYPES[self._table._types[self._index]]
+
+    @property
+    def ward(self) -> int:
+        return self._table._wards[self._index]
+
+    @property
+    def year(self) -> int:
+        return self._table._years[self._index]
+
+    @property
+    def reviews(self) -> list[Review]:
+        return [Review(t, self._table._ratings[t][self._index]) for t in RATING_TYPES]
+
+    def apartment_min_rating(self) -> tuple[str, float]:
+        """Return the minimum rating for the apartment building.
+        >>> ApartmentTable.from_apartments([ApartmentBuilding('PRIVATE', 1, 2000, [Review('COSMETIC', 2), Review('MODERATE RISK', 1), Review('HIGH RISK', 3), Review('OVERALL', 70)])])[0].apartment_min_rating()
+        ('MODERATE RISK', 1.0)
+        """
+        return min(((t, self._table._ratings[t][self._index]) for t in RATING_TYPES), key=lambda r: r[1])
+
+    def apartment_rating(self, rating_type: str) -> float:
+        return self._table._ratings[rating_type][self._index]
+
+    def apartment_overall_rating(self) -> float:
+        return self._table._ratings[OVERALL][self._index]
+
+    def apartment_cosmetic_rating(self) -> float:
+        return self._table._ratings[COSMETIC][self._index]
+
+    def _source(self) -> tuple[ApartmentTable, int]:
+        """Return the table this row was first read from and its position there, following
+        the row back through any slices of that table."""
+        table = self._table
+        if table._origin is None:
+            return table, self._index
+        return table._origin, table._rows[self._index]
+
+    def __eq__(self, other) -> bool:
+        if not isinstance(other, ApartmentRow):
+            return False
+        table, index = self._source()
+        other_table, other_index = other._source()
+        return table is other_table and index == other_index
+
+    def __hash__(self) -> int:
+        table, index = self._source()
+        return hash((id(table), index))
+
+    def __repr__(self) -> str:
+        return f"ApartmentRow({self.type!r}, {self.ward}, {self.year}, {self.reviews})"
 
 
 if __name__ == "__main__":
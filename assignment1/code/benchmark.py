@@ -0,0 +1,120 @@
+"""Scaling benchmark for the classifiers on synthetic apartment data.
+
+Times LinearRegression.train, LinearRegression.predict, make_predictions for both
+models, NearestNeighbour construction and predict, and calculate_mse on synthetic
+datasets of increasing size, and prints the throughput and peak memory of each
+step as JSON. Every size is run twice: once with the data in an ApartmentTable, and
+once as a list of ApartmentBuilding objects, as load_data and the autograder use.
+
+Run from this directory with, for example:
+    python benchmark.py --sizes 1000 10000 100000 --output bench.json
+"""
+import argparse
+import json
+import random
+import time
+import tracemalloc
+
+from abstractions import ApartmentBuilding, ApartmentTable, Review, APARTMENT_TYPES, RATING_TYPES
+from classifiers import LinearRegression, NearestNeighbour, calculate_mse
+
+DEFAULT_SIZES = [1000, 10000, 100000, 1000000, 10000000]
+QUERY_LIMIT = 10000  # single-apartment predict calls timed per size
+
+
+def _rating(rng: random.Random, mean: float, sd: float, decimals: int) -> float:
+    """Return a normally distributed rating clipped to [0, 3], like the city's ratings."""
+    return round(min(3.0, max(0.0, rng.gauss(mean, sd))), decimals)
+
+
+def synthetic_apartments(rows: int, seed: int = 1516) -> ApartmentTable:
+    """Return an ApartmentTable of `rows` synthetic buildings whose ratings follow the
+    distributions of datafolder/apartments.csv. Cosmetic ratings have one decimal, the
+    risk ratings two, and the overall rating is a noisy linear function of the three.
+    The same `rows` and `seed` always give the same table.
+    >>> t = synthetic_apartments(3)
+    >>> len(t), t[0].type in APARTMENT_TYPES
+    (3, True)
+    >>> synthetic_apartments(3).column('OVERALL') == t.column('OVERALL')
+    True
+    """
+    rng = random.Random(seed)
+    table = ApartmentTable()
+    for _ in range(rows):
+        cosmetic = _rating(rng, 2.6, 0.43, 1)
+        moderate = _rating(rng, 2.6, 0.30, 2)
+        high = _rating(rng, 2.71, 0.22, 2)
+        overall = round(min(100.0, max(0.0, -1.0 + 1.84 * cosmetic + 14.35 * moderate + 17.44 * high + rng.gauss(0, 0.6))))
+        table.append(rng.choices(APARTMENT_TYPES, weights=[9, 84, 7])[0], rng.randint(1, 25), rng.randint(1900, 2023),
+                     cosmetic, moderate, high, overall)
+    return table
+
+
+def synthetic_buildings(rows: int, seed: int = 1516) -> list[ApartmentBuilding]:
+    """Return the buildings of synthetic_apartments(rows, seed) as a list of ApartmentBuilding
+    objects with one review of each type.
+    >>> b = synthetic_buildings(3)
+    >>> [a.apartment_overall_rating() for a in b] == list(synthetic_apartments(3).column('OVERALL'))
+    True
+    """
+    return [ApartmentBuilding(a.type, a.ward, a.year, [Review(t, a.apartment_rating(t)) for t in RATING_TYPES])
+            for a in synthetic_apartments(rows, seed)]
+
+
+def _measure(step, items: int, memory: bool) -> dict:
+    """Run `step()` and return its wall time, throughput and, if `memory` is true, the peak
+    memory it allocated. The peak is measured in a second run, because tracing
+    allocations slows the code down."""
+    start = time.perf_counter()
+    step()
+    seconds = time.perf_counter() - start
+    result = {'items': items, 'seconds': seconds, 'items_per_second': items / seconds if seconds > 0 else None}
+    if memory:
+        tracemalloc.start()
+        step()
+        result['peak_bytes'] = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    return result
+
+
+def benchmark(rows: int, memory: bool = True, buildings: bool = False) -> dict:
+    """Return the measurements of every step on a synthetic dataset of `rows` buildings,
+    half of which are used for training and half of which are rated. The data is held
+    in ApartmentTables, or in lists of ApartmentBuilding objects if `buildings` is true."""
+    make = synthetic_buildings if buildings else synthetic_apartments
+    training = make(rows // 2)
+    testing = make(rows - rows // 2, seed=1517)
+    queries = [testing[i] for i in range(min(QUERY_LIMIT, len(testing)))]
+
+    lr = LinearRegression()
+    lr.train(training)
+    nn = NearestNeighbour(training)
+    predictions = nn.make_predictions(testing)
+
+    return {
+        'rows': rows,
+        'data': 'list[ApartmentBuilding]' if buildings else 'ApartmentTable',
+        'LinearRegression.train': _measure(lambda: lr.train(training), len(training), memory),
+        'LinearRegression.predict': _measure(lambda: [lr.predict(a) for a in queries], len(queries), memory),
+        'LinearRegression.make_predictions': _measure(lambda: lr.make_predictions(testing), len(testing), memory),
+        'NearestNeighbour.__init__': _measure(lambda: NearestNeighbour(training), len(training), memory),
+        'NearestNeighbour.predict': _measure(lambda: [nn.predict(a) for a in queries], len(queries), memory),
+        'NearestNeighbour.make_predictions': _measure(lambda: nn.make_predictions(testing), len(testing), memory),
+        'calculate_mse': _measure(lambda: calculate_mse(predictions), len(predictions), memory),
+    }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=DEFAULT_SIZES, help='numbers of synthetic buildings')
+    parser.add_argument('--no-memory', action='store_true', help='skip the peak memory measurements')
+    parser.add_argument('--output', help='write the JSON report to this file instead of printing it')
+    args = parser.parse_args()
+
+    report = [benchmark(rows, memory=not args.no_memory, buildings=buildings)
+              for rows in args.sizes for buildings in (False, True)]
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+    else:
+        print(json.dumps(report, indent=2))
@@ -0,0 +1,60 @@
+"""Ingest benchmark: time to load a large apartments csv file with each loader.
+
+Writes a synthetic csv file in the format of datafolder/apartments.csv, then times
+reading a list of ApartmentBuilding objects row by row with iter_apartments (how load_data
+used to load a dataset), load_table with the row-by-row 'csv' engine, and load_data, which
+uses load_table's bulk 'fast' engine. It prints the speed-up of each over the objects,
+and over the 'csv' engine, which builds the same table as the 'fast' engine and so
+isolates the gain from bulk parsing.
+
+Run from this directory with, for example:
+    python benchmark_ingest.py --rows 1000000
+"""
+import argparse
+import os
+import tempfile
+import time
+
+import data
+from abstractions import RATING_TYPES
+from benchmark import synthetic_apartments
+
+HEADER = 'YEAR BUILT,PROPERTY TYPE,WARD,COSMETIC EVALUATION,MODERATE RISK EVALUATION,HIGH RISK EVALUATION,CURRENT BUILDING EVAL SCORE'
+
+
+def write_csv(path: str, rows: int) -> None:
+    """Write `rows` synthetic buildings to a csv file at `path`."""
+    table = synthetic_apartments(rows)
+    with open(path, 'w') as f:
+        f.write(HEADER + '\n')
+        for a in table:
+            ratings = [a.apartment_rating(t) for t in RATING_TYPES]
+            f.write(f'{a.year},{a.type},{a.ward},{ratings[0]},{ratings[1]},{ratings[2]},{ratings[3]:g}\n')
+
+
+def time_loader(load) -> float:
+    """Return the seconds taken by `load()`."""
+    start = time.perf_counter()
+    load()
+    return time.perf_counter() - start
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=1000000, help='number of synthetic buildings in the file')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        write_csv(os.path.join(directory, 'synthetic.csv'), args.rows)
+        data.DATA_DIRECTORY = directory
+        timings = {
+            'list(iter_apartments)': time_loader(lambda: list(data.iter_apartments('synthetic.csv'))),
+            "load_table(engine='csv')": time_loader(lambda: data.load_table('synthetic.csv', engine='csv')),
+            'load_data': time_loader(lambda: data.load_data('synthetic.csv')),
+        }
+
+    objects_seconds = timings['list(iter_apartments)']
+    csv_seconds = timings["load_table(engine='csv')"]
+    for name, seconds in timings.items():
+        print(f'{name:>26}: {seconds:8.3f} s  ({objects_seconds / seconds:5.1f}x the objects, '
+              f'{csv_seconds / seconds:4.1f}x the csv engine)')
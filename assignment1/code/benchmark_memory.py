@@ -0,0 +1,89 @@
+"""Memory benchmark: bytes per apartment building for each way of holding the data.
+
+Each kind of building is measured as created, and again after apartment_overall_rating()
+has been called on every building, since the slotted ApartmentBuilding indexes its ratings
+on first use. Each measurement is also shown as a change from the baseline classes in the
+same state, so that any memory the slotted classes gain when their ratings are read shows up.
+
+Run from this directory with:
+    python benchmark_memory.py
+"""
+import tracemalloc
+
+from abstractions import Review, ApartmentBuilding, ApartmentTable, RATING_TYPES
+
+
+# The original dict-backed classes, with the same attributes as before __slots__ and
+# the ratings index were added.
+class BaselineReview:
+    def __init__(self, rating_type: str, rating: float) -> None:
+        self._rating_type = rating_type
+        self._rating = rating
+
+    @property
+    def type(self) -> str:
+        return self._rating_type
+
+    @property
+    def rating(self) -> float:
+        return self._rating
+
+class BaselineApartmentBuilding:
+    def __init__(self, type: str, ward: int, year: int, reviews: list) -> None:
+        self._type = type
+        self._ward = ward
+        self._year = year
+        self._reviews = reviews
+
+    def apartment_overall_rating(self) -> float:
+        for r in self._reviews:
+            if r.type == 'OVERALL':
+                return r.rating
+        return 0
+
+
+def make_buildings(n: int, review_class, building_class) -> list:
+    """Return `n` synthetic buildings with four reviews each."""
+    return [building_class('PRIVATE', i % 25, 1900 + i % 120,
+                           [review_class(t, (i % 30) / 10) for t in RATING_TYPES])
+            for i in range(n)]
+
+
+def make_table(n: int) -> ApartmentTable:
+    """Return an ApartmentTable holding `n` synthetic buildings."""
+    table = ApartmentTable()
+    for i in range(n):
+        r = (i % 30) / 10
+        table.append('PRIVATE', i % 25, 1900 + i % 120, r, r, r, r)
+    return table
+
+
+def bytes_per_building(build, n: int, read: bool = False) -> float:
+    """Return the memory held by the buildings `build(n)` returns, divided by `n`. If `read`
+    is true, apartment_overall_rating() is called on every building before measuring."""
+    tracemalloc.start()
+    data = build(n)
+    if read:
+        for a in data:
+            a.apartment_overall_rating()
+    used = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del data
+    return used / n
+
+
+if __name__ == '__main__':
+    n = 100000
+    baseline = lambda k: make_buildings(k, BaselineReview, BaselineApartmentBuilding)
+    slotted = lambda k: make_buildings(k, Review, ApartmentBuilding)
+    results = {
+        'baseline objects': bytes_per_building(baseline, n),
+        'baseline objects, read': bytes_per_building(baseline, n, read=True),
+        'slotted objects': bytes_per_building(slotted, n),
+        'slotted objects, read': bytes_per_building(slotted, n, read=True),
+        'ApartmentTable': bytes_per_building(make_table, n),
+        'ApartmentTable, read': bytes_per_building(make_table, n, read=True),
+    }
+    for name, size in results.items():
+        baseline_size = results['baseline objects, read' if name.endswith(', read') else 'baseline objects']
+        print(f'{name:>24}: {size:8.1f} bytes per building ({size / baseline_size - 1:+.0%} against the baseline)')
@@ -1,8 +1,104 @@
+from __future__ import annotations
+from array import array
+from bisect import bisect_left
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+from typing import Iterable, Optional
+import math
+import mmap
+import struct
+
+import numpy as np
 from matplotlib import pyplot as plt
 
-from data import APARTMENT_DATA, TESTING_DATA
+from data import apartment_data, testing_data
+from spatial import PointKDTree, EUCLIDEAN, MANHATTAN
 from abstractions import *
 
+# Model files start with magic bytes naming the kind of model and a format version.
+MODEL_VERSION = 1
+NN_MAGIC = b'NNMD'
+NN_HEADER = struct.Struct('<4sIq')  # magic, version, number of entries in the index
+LR_MAGIC = b'LRMD'
+LR_FORMAT = struct.Struct('<4sIq8d')  # magic, version, n, running statistics, a, b, R^2
+
+# Limits on when NearestNeighbour builds a dense lookup table of predictions.
+LOOKUP_MAX_DECIMALS = 3
+LOOKUP_MAX_SIZE = 1000000
+
+def _cosmetic_overall_pairs(apartments: Iterable[ApartmentBuilding]) -> Iterable[tuple[float, float]]:
+    """Return an iterator over the (COSMETIC, OVERALL) ratings of `apartments`.
+    The ratings of an ApartmentTable are read straight from its columns.
+    >>> list(_cosmetic_overall_pairs(apartment_data()[:2])) == list(_cosmetic_overall_pairs(ApartmentTable.from_apartments(apartment_data()[:2])))
+    True
+    """
+    if isinstance(apartments, ApartmentTable):
+        return zip(apartments.column(COSMETIC), apartments.column(OVERALL))
+    return ((a.apartment_cosmetic_rating(), a.apartment_overall_rating()) for a in apartments)
+
+
+class PredictionCache:
+    """A bounded cache of predictions keyed by the features they were made from.
+    When it is full, the least recently used prediction is forgotten.
+    A cache with a size of zero stores nothing.
+    >>> cache = PredictionCache(2)
+    >>> cache.put(2.5, 80.0)
+    >>> cache.put(1.5, 60.0)
+    >>> cache.get(2.5), cache.get(3.0)
+    (80.0, None)
+    >>> cache.put(3.0, 95.0)  # forgets 1.5, the least recently used
+    >>> cache.get(1.5), cache.get(3.0)
+    (None, 95.0)
+    >>> cache.info()
+    {'hits': 2, 'misses': 2, 'size': 2, 'maxsize': 2, 'hit_rate': 0.5}
+    """
+    _maxsize: int
+    _entries: OrderedDict
+    _hits: int
+    _misses: int
+
+    def __init__(self, maxsize: int) -> None:
+        """Return an empty PredictionCache holding at most `maxsize` predictions."""
+        assert isinstance(maxsize, int) and maxsize >= 0, "maxsize must be a non-negative integer"
+        self._maxsize = maxsize
+        self._entries = OrderedDict()
+        self._hits = 0
+        self._misses = 0
+
+    def get(self, key) -> Optional[float]:
+        """Return the prediction cached for `key`, or None if there is none."""
+        if self._maxsize == 0:
+            return None
+        prediction = self._entries.get(key)
+        if prediction is None:
+            self._misses += 1
+        else:
+            self._hits += 1
+            self._entries.move_to_end(key)
+        return prediction
+
+    def put(self, key, prediction: float) -> None:
+        """Remember `prediction` for `key`."""
+        if self._maxsize == 0:
+            return
+        self._entries[key] = prediction
+        self._entries.move_to_end(key)
+        if len(self._entries) > self._maxsize:
+            self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        """Forget every prediction, for example because the model has been retrained."""
+        self._entries.clear()
+
+    def info(self) -> dict[str, float]:
+        """Return the number of hits and misses, the size and maximum size of the cache,
+        and the fraction of lookups that were hits."""
+        lookups = self._hits + self._misses
+        return {'hits': self._hits, 'misses': self._misses, 'size': len(self._entries),
+                'maxsize': self._maxsize, 'hit_rate': self._hits / lookups if lookups > 0 else 0.0}
+
+
 ##################################
 # Phase 2: Nearest Neighbour
 ##################################
@@ -10,10 +106,118 @@ class NearestNeighbour:
     """A Nearest Neighbour model to predict ratings
      of an apartment."""
     _training_data: list[ApartmentBuilding]
+    _cosmetics: list[float]
+    _overalls: list[float]
+    _first_seen: list[int]
+    _path: str
+    _cache: PredictionCache
+    _lookup: Optional[list[float]]
+    _lookup_scale: int
+    _lookup_low: int
 
-    def __init__(self, training_data) -> None:
-        """Return a NearestNeighbour abstraction."""
+    def __init__(self, training_data, cache_size: int = 0, lookup_table: bool = False) -> None:
+        """Return a NearestNeighbour abstraction. If `cache_size` is positive, the
+        predictions for up to that many recently seen cosmetic ratings are remembered.
+        If `lookup_table` is true and the cosmetic ratings of the training data are
+        quantised, a dense table of predictions is built (see `_build_lookup_table`)."""
         self._training_data = training_data  # initialize the training data
+        self._path = None  # the model file the index is mapped from, if it was loaded from one
+        self._cache = PredictionCache(cache_size)
+        self._build_index()
+        self._lookup = None
+        if lookup_table:
+            self._build_lookup_table()
+
+    def _build_lookup_table(self) -> None:
+        """If every training cosmetic rating has at most LOOKUP_MAX_DECIMALS decimal places,
+        precompute the prediction for every value on that grid between the smallest and
+        largest rating, so that predicting for a rating on the grid is a single list index.
+        Ratings off the grid, or outside the range of the training data, still use the
+        binary search.
+        >>> training = [ApartmentBuilding('PRIVATE', 1, 2000, [Review('COSMETIC', 1.5), Review('OVERALL', 60)]), ApartmentBuilding('PRIVATE', 1, 2000, [Review('COSMETIC', 2.0), Review('OVERALL', 80)])]
+        >>> r = NearestNeighbour(training, lookup_table=True)
+        >>> r._lookup_scale, r._lookup
+        (10, [60, 60, 60, 80, 80, 80])
+        >>> r.predict(ApartmentBuilding('PRIVATE', 1, 2000, [Review('COSMETIC', 1.8)])), r.predict(ApartmentBuilding('PRIVATE', 1, 2000, [Review('COSMETIC', 1.76)]))
+        (80, 80)
+        >>> r.predict(ApartmentBuilding('PRIVATE', 1, 2000, [Review('COSMETIC', float('nan'))])), r.predict(ApartmentBuilding('PRIVATE', 1, 2000, [Review('COSMETIC', float('inf'))]))
+        (60, 80)
+        """
+        self._lookup = None
+        if len(self._cosmetics) == 0 or not all(math.isfinite(c) for c in self._cosmetics):
+            return
+
+        for decimals in range(LOOKUP_MAX_DECIMALS + 1):
+            scale = 10 ** decimals
+            if all(round(c * scale) / scale == c for c in self._cosmetics):
+                break
+        else:
+            return  # the ratings are not quantised
+        low = round(self._cosmetics[0] * scale)
+        high = round(self._cosmetics[-1] * scale)
+        if high - low + 1 > LOOKUP_MAX_SIZE:
+            return
+
+        self._lookup_scale = scale
+        self._lookup_low = low
+        self._lookup = [self._overalls[self._nearest(k / scale)] for k in range(low, high + 1)]
+
+    def _lookup_prediction(self, cosmetic_rating: float) -> Optional[float]:
+        """Return the prediction for `cosmetic_rating` from the lookup table, or None if
+        the rating is not on the table's grid."""
+        if not math.isfinite(cosmetic_rating):
+            return None
+        k = round(cosmetic_rating * self._lookup_scale)
+        if k / self._lookup_scale == cosmetic_rating and 0 <= k - self._lookup_low < len(self._lookup):
+            return self._lookup[k - self._lookup_low]
+        return None
+
+    def _build_index(self) -> None:
+        """Precompute a sorted index over the COSMETIC ratings of the training data.
+        Each distinct cosmetic rating is stored once, together with the overall rating and
+        position of the first training apartment that has it, so that ties are broken in
+        favour of the apartment that appears earliest in the training data. Ratings that are
+        NaN or infinite are left out: they are never nearer to a rating than any other.
+        >>> training = [ApartmentBuilding('PRIVATE', 1, 2000, [Review('COSMETIC', 2.0), Review('OVERALL', 70)]), ApartmentBuilding('PRIVATE', 1, 2000, [Review('COSMETIC', 1.0), Review('OVERALL', 60)]), ApartmentBuilding('PRIVATE', 1, 2000, [Review('COSMETIC', 2.0), Review('OVERALL', 90)])]
+        >>> r = NearestNeighbour(training)
+        >>> r._cosmetics, r._overalls, r._first_seen
+        ([1.0, 2.0], [60, 70], [1, 0])
+        >>> training = [ApartmentBuilding('PRIVATE', 1, 2000, [Review('COSMETIC', c), Review('OVERALL', o)]) for c, o in [(3.0, 90), (float('nan'), 75), (1.0, 60)]]
+        >>> r = NearestNeighbour(training)
+        >>> r._cosmetics, r.predict(ApartmentBuilding('PRIVATE', 1, 2000, [Review('COSMETIC', 1.0)]))
+        ([1.0, 3.0], 60)
+        """
+        first = {}  # cosmetic rating -> (index, overall rating) of its first occurrence
+        for i, (cosmetic, overall) in enumerate(_cosmetic_overall_pairs(self._training_data)):
+            if cosmetic not in first and math.isfinite(cosmetic):
+                first[cosmetic] = (i, overall)
+
+        self._cache.clear()
+        self._cosmetics = sorted(first)
+        self._overalls = [first[c][1] for c in self._cosmetics]
+        self._first_seen = [first[c][0] for c in self._cosmetics]
+
+    def _nearest(self, cosmetic_rating: float) -> int:
+        """Return the position in the sorted index of the cosmetic rating nearest to
+        `cosmetic_rating`, using a binary search. On equal distances the rating whose
+        apartment appears first in the training data wins.
+        """
+        return self._closer(cosmetic_rating, bisect_left(self._cosmetics, cosmetic_rating))
+
+    def _closer(self, cosmetic_rating: float, i: int) -> int:
+        """Return whichever of positions `i - 1` and `i` in the sorted index is nearest to
+        `cosmetic_rating`, where `i` is the position at which `cosmetic_rating` would be inserted.
+        """
+        if i == 0:
+            return 0
+        if i == len(self._cosmetics):
+            return i - 1
+
+        below_diff = abs(cosmetic_rating - self._cosmetics[i - 1])
+        above_diff = abs(cosmetic_rating - self._cosmetics[i])
+        if below_diff < above_diff or (below_diff == above_diff and self._first_seen[i - 1] < self._first_seen[i]):
+            return i - 1
+        return i
 
     def predict(self, apartment: ApartmentBuilding) -> float:
         """Use the parameters of the nearest neighbour model to predict an overall rating for
@@ -33,18 +237,27 @@ class NearestNeighbour:
         >>> r = NearestNeighbour(training)
         >>> round(r.predict(apartment), 1)
         91
+        >>> r.predict(ApartmentBuilding('SOCIAL HOUSING', 1, 1973, [Review('COSMETIC', 11.5)]))
+        91
         """
-        predict_overall = 0
-        cosmetic_rating = apartment.apartment_cosmetic_rating()
-        min_diff = max([abs(cosmetic_rating - a.apartment_cosmetic_rating()) for a in self._training_data])
-        
-        for a in self._training_data:
-            diff = abs(cosmetic_rating - a.apartment_cosmetic_rating())
-            if diff < min_diff:
-                min_diff = diff
-                predict_overall = a.apartment_overall_rating()
-        
-        return predict_overall
+        if len(self._cosmetics) == 0:
+            return 0
+
+        key = apartment.apartment_cosmetic_rating()
+        if self._lookup is not None:
+            prediction = self._lookup_prediction(key)
+            if prediction is not None:
+                return prediction
+
+        prediction = self._cache.get(key)
+        if prediction is None:
+            prediction = self._overalls[self._nearest(key)]
+            self._cache.put(key, prediction)
+        return prediction
+
+    def cache_info(self) -> dict[str, float]:
+        """Return the hit and miss statistics of the prediction cache."""
+        return self._cache.info()
 
     def make_predictions(self, apartments: list[ApartmentBuilding]) -> dict[ApartmentBuilding, float]:
         """Return the predicted rating for each apartment in `apartments`.
@@ -53,17 +266,207 @@ class NearestNeighbour:
 
         Arguments:
         apartments -- A list of apartments to be rated
-        >>> apartments = APARTMENT_DATA[:10]
+        >>> apartments = apartment_data()[:10]
         >>> training = [ApartmentBuilding('SOCIAL HOUSING', 1, 1973, [Review('MODERATE RISK', 6), Review('COSMETIC', 1.6), Review('OVERALL', 91)]), ApartmentBuilding('SOCIAL HOUSING', 1, 1973, [Review('MODERATE RISK', 6), Review('COSMETIC', 1.0), Review('OVERALL', 86)]), ApartmentBuilding('SOCIAL HOUSING', 1, 1973, [Review('MODERATE RISK', 6), Review('COSMETIC', 2.1), Review('OVERALL', 56)])]
         >>> r = NearestNeighbour(training)
         >>> list(r.make_predictions(apartments).values())
         [56, 56, 56, 91, 86, 86, 86, 56, 86, 56]
+        >>> queries = [ApartmentBuilding('PRIVATE', 1, 2000, [Review('COSMETIC', c)]) for c in (3.0, float('nan'), 1.1)]
+        >>> list(r.make_predictions(queries).values()) == [r.predict(a) for a in queries]
+        True
+        """
+        predicted_ratings = {}
+        if len(self._cosmetics) == 0:
+            for a in apartments:
+                predicted_ratings[a] = 0
+            return predicted_ratings
+
+        # resolve every query at once with a binary search of the sorted index, choosing
+        # between the ratings either side of each query in the same way as _closer
+        if isinstance(apartments, ApartmentTable):
+            queries = np.asarray(apartments.column(COSMETIC), dtype=float)
+        else:
+            queries = np.fromiter((a.apartment_cosmetic_rating() for a in apartments), dtype=float, count=len(apartments))
+        cosmetics = np.asarray(self._cosmetics, dtype=float)
+        first_seen = np.asarray(self._first_seen)
+        last = len(cosmetics) - 1
+
+        above = np.searchsorted(cosmetics, queries, side='left')
+        below = np.maximum(above - 1, 0)
+        clipped = np.minimum(above, last)
+        below_diff = np.abs(queries - cosmetics[below])
+        above_diff = np.abs(queries - cosmetics[clipped])
+        pick_below = (below_diff < above_diff) | ((below_diff == above_diff) & (first_seen[below] < first_seen[clipped]))
+        nearest = np.where(above == 0, 0, np.where((above > last) | pick_below, below, clipped))
+
+        # NaN and infinite ratings are resolved as predict resolves them
+        for i in np.flatnonzero(~np.isfinite(queries)).tolist():
+            nearest[i] = self._nearest(queries[i].item())
+
+        overalls = self._overalls
+        for a, i in zip(apartments, nearest.tolist()):
+            predicted_ratings[a] = overalls[i]
+
+        return predicted_ratings
+
+    def save(self, path: str) -> None:
+        """Save the model to the file at `path`. The sorted index is written as three
+        arrays (cosmetic ratings, overall ratings and training positions) of 8-byte
+        values in machine byte order, after a short header, so that `load` can map them
+        into memory instead of reading them.
+        """
+        with open(path, 'wb') as f:
+            f.write(NN_HEADER.pack(NN_MAGIC, MODEL_VERSION, len(self._cosmetics)))
+            array('d', self._cosmetics).tofile(f)
+            array('d', self._overalls).tofile(f)
+            array('q', self._first_seen).tofile(f)
+
+    @staticmethod
+    def load(path: str) -> NearestNeighbour:
+        """Return the model saved in the file at `path`.
+        The file is memory-mapped read-only and the model reads its index straight from the
+        mapping, so loading takes the same time for any size of model, and processes that
+        load the same file share one copy of it through the operating system's page cache.
+        A loaded model does not have its training data.
+        >>> import os, tempfile
+        >>> r = NearestNeighbour(apartment_data()[40:])
+        >>> path = os.path.join(tempfile.mkdtemp(), 'nn.model')
+        >>> r.save(path)
+        >>> NearestNeighbour.load(path).make_predictions(apartment_data()[:40]) == r.make_predictions(apartment_data()[:40])
+        True
+        """
+        model = NearestNeighbour.__new__(NearestNeighbour)
+        model._map(path)
+        return model
+
+    def _map(self, path: str) -> None:
+        """Point the model's index at the arrays in the model file at `path`, mapped into memory."""
+        with open(path, 'rb') as f:
+            mapping = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, n = NN_HEADER.unpack_from(mapping)
+        if magic != NN_MAGIC or version != MODEL_VERSION:
+            raise ValueError(f'{path} is not a nearest neighbour model file')
+        if n < 0 or len(mapping) != NN_HEADER.size + 24 * n:
+            raise ValueError(f'{path} is truncated or corrupt')
+
+        view = memoryview(mapping)
+        start = NN_HEADER.size
+        self._cosmetics = view[start:start + 8 * n].cast('d')
+        self._overalls = view[start + 8 * n:start + 16 * n].cast('d')
+        self._first_seen = view[start + 16 * n:start + 24 * n].cast('q')
+        self._training_data = None
+        self._path = path
+        self._cache = PredictionCache(0)
+        self._lookup = None
+
+    def __getstate__(self) -> dict:
+        """Return the state to pickle. A model loaded from a file is pickled as the path of
+        that file, so that worker processes map the same file rather than copying the model."""
+        if self._path is not None:
+            return {'_path': self._path}
+        return self.__dict__
+
+    def __setstate__(self, state: dict) -> None:
+        if '_path' in state and len(state) == 1:
+            self._map(state['_path'])
+        else:
+            self.__dict__.update(state)
+
+
+##################################
+# k Nearest Neighbours
+##################################
+class KNearestNeighbours:
+    """A k nearest neighbours model to predict ratings of an apartment from any
+    combination of its COSMETIC, MODERATE RISK and HIGH RISK ratings.
+    The training apartments are indexed in a KD-tree, so finding the neighbours of an
+    apartment does not compare it against every training apartment.
+    With k = 1 and only the COSMETIC feature this makes the same predictions as NearestNeighbour.
+    >>> training = [ApartmentBuilding('PRIVATE', 1, 2000, [Review('COSMETIC', 1.0), Review('HIGH RISK', 1.0), Review('OVERALL', 60)]), ApartmentBuilding('PRIVATE', 1, 2000, [Review('COSMETIC', 2.0), Review('HIGH RISK', 3.0), Review('OVERALL', 80)]), ApartmentBuilding('PRIVATE', 1, 2000, [Review('COSMETIC', 3.0), Review('HIGH RISK', 2.0), Review('OVERALL', 90)])]
+    >>> apartment = ApartmentBuilding('PRIVATE', 1, 2000, [Review('COSMETIC', 2.4), Review('HIGH RISK', 2.0)])
+    >>> KNearestNeighbours(training, features=[COSMETIC, HIGH_RISK], k=1).predict(apartment)
+    90
+    >>> KNearestNeighbours(training, features=[COSMETIC], k=2).predict(apartment)
+    85.0
+    >>> round(KNearestNeighbours(training, features=[COSMETIC], k=2, weighted=True).predict(apartment), 1)
+    84.0
+    """
+    _features: list[str]
+    _k: int
+    _weighted: bool
+    _metric: str
+    _overalls: list[float]
+    _tree: PointKDTree
+
+    def __init__(self, training_data, features: tuple[str, ...] = (COSMETIC,), k: int = 1, weighted: bool = False, metric: str = EUCLIDEAN) -> None:
+        """Return a KNearestNeighbours abstraction.
+
+        Arguments:
+        training_data -- The apartments (or ApartmentTable) to learn from
+        features -- The rating types used to measure the distance between apartments
+        k -- The number of neighbours whose overall ratings are averaged
+        weighted -- Whether to weight each neighbour by the inverse of its distance
+        metric -- The distance measure, EUCLIDEAN or MANHATTAN
+        """
+        assert len(features) > 0 and all(f in RATING_TYPES and f != OVERALL for f in features), "features must be rating types other than 'OVERALL'"
+        assert isinstance(k, int) and k > 0, "k must be a positive integer"
+        assert metric in (EUCLIDEAN, MANHATTAN), "metric must be 'euclidean' or 'manhattan'"
+        self._features = list(features)
+        self._k = k
+        self._weighted = weighted
+        self._metric = metric
+
+        if isinstance(training_data, ApartmentTable):
+            columns = [training_data.column(f) for f in self._features]
+            points = list(zip(*columns))
+            self._overalls = list(training_data.column(OVERALL))
+        else:
+            points = [self._point(a) for a in training_data]
+            self._overalls = [a.apartment_overall_rating() for a in training_data]
+        self._tree = PointKDTree(points)
+
+    def _point(self, apartment: ApartmentBuilding) -> tuple[float, ...]:
+        """Return the features of `apartment` as a point."""
+        return tuple(apartment.apartment_rating(f) for f in self._features)
+
+    def predict(self, apartment: ApartmentBuilding) -> float:
+        """Predict an overall rating for `apartment` by averaging the overall ratings of its
+        k nearest neighbours in the training data. When the average is weighted and some
+        neighbours are at distance zero, only those neighbours are averaged.
+
+        Arguments:
+        apartment -- An apartment abstraction
+        """
+        if len(self._tree) == 0:
+            return 0
+
+        neighbours = self._tree.nearest(self._point(apartment), self._k, self._metric)
+        if not self._weighted:
+            if len(neighbours) == 1:
+                return self._overalls[neighbours[0][0]]
+            return sum(self._overalls[i] for i, _ in neighbours) / len(neighbours)
+
+        exact = [i for i, d in neighbours if d == 0]
+        if len(exact) > 0:
+            return sum(self._overalls[i] for i in exact) / len(exact)
+        weights = [1 / d for _, d in neighbours]
+        return sum(w * self._overalls[i] for w, (i, _) in zip(weights, neighbours)) / sum(weights)
+
+    def make_predictions(self, apartments: list[ApartmentBuilding]) -> dict[ApartmentBuilding, float]:
+        """Return the predicted rating for each apartment in `apartments`.
+
+        Arguments:
+        apartments -- A list of apartments to be rated
+        >>> nn = NearestNeighbour(apartment_data()[40:])
+        >>> knn = KNearestNeighbours(apartment_data()[40:])
+        >>> knn.make_predictions(apartment_data()[:40]) == nn.make_predictions(apartment_data()[:40])
+        True
         """
         predicted_ratings = {}
 
         for a in apartments:
             predicted_ratings[a] = self.predict(a)
-        
+
         return predicted_ratings
 
 
@@ -78,41 +481,182 @@ class LinearRegression:
     _xs: list[float]
     _ys: list[float]
     _r_squared: float
+    _n: int
+    _mean_x: float
+    _mean_y: float
+    _s_xx: float
+    _s_yy: float
+    _s_xy: float
+    _cache: PredictionCache
 
-    def __init__(self) -> None:
-        """Return a LinearRegression abstraction."""
+    def __init__(self, cache_size: int = 0) -> None:
+        """Return a LinearRegression abstraction. If `cache_size` is positive, the
+        predictions for up to that many recently seen cosmetic ratings are remembered."""
+        self._cache = PredictionCache(cache_size)
         self._a = 0  # intercept of regression line
         self._b = 0  # slope of regression line
         self._xs = []  # x values used to train model
         self._ys = []  # y values used to train model
         self._r_squared = 0  # r-squared value of model (how well it fits the training data)
+        self._reset_statistics()
 
-    def train(self, apartments: list[ApartmentBuilding]) -> None:
+    def _reset_statistics(self) -> None:
+        """Forget the running statistics accumulated from previous training data."""
+        self._n = 0  # number of apartments seen
+        self._mean_x = 0.0  # running mean of the cosmetic ratings
+        self._mean_y = 0.0  # running mean of the overall ratings
+        self._s_xx = 0.0  # running sum of squared deviations of x from its mean
+        self._s_yy = 0.0  # running sum of squared deviations of y from its mean
+        self._s_xy = 0.0  # running sum of co-deviations of x and y
+
+    def _accumulate(self, apartments: Iterable[ApartmentBuilding]) -> None:
+        """Fold every apartment in `apartments` into the running statistics in a single pass,
+        using Welford's update so the sums stay numerically stable. The statistics are only
+        updated once the whole batch has been read, so a batch that fails part of the way
+        through leaves them as they were.
+        """
+        n, mean_x, mean_y, s_xx, s_yy, s_xy = self._n, self._mean_x, self._mean_y, self._s_xx, self._s_yy, self._s_xy
+        for x, y in _cosmetic_overall_pairs(apartments):
+            n += 1
+            dx = x - mean_x
+            mean_x += dx / n
+            dy = y - mean_y
+            mean_y += dy / n
+            s_xx += dx * (x - mean_x)
+            s_yy += dy * (y - mean_y)
+            s_xy += dx * (y - mean_y)
+        self._n, self._mean_x, self._mean_y, self._s_xx, self._s_yy, self._s_xy = n, mean_x, mean_y, s_xx, s_yy, s_xy
+
+    def _fit(self) -> None:
+        """Set the parameters and R^2 value of the model from the running statistics.
+        While the cosmetic ratings seen so far are all the same (for example, after a single
+        apartment), the least-squares line is the flat one through the mean overall rating.
+        R^2 is undefined while either the cosmetic or the overall ratings are all the same,
+        and is set to 0.
+        """
+        self._cache.clear()
+        self._b = self._s_xy/self._s_xx if self._s_xx != 0 else 0
+        self._a = self._mean_y - (self._b * self._mean_x)
+
+        if self._s_xx == 0 or self._s_yy == 0:
+            self._r_squared = 0
+        else:
+            self._r_squared = self._s_xy**2/(self._s_xx * self._s_yy)
+
+    def train(self, apartments: Iterable[ApartmentBuilding]) -> None:
         """Train a rating predictor (a function mapping COSMETIC apartment ratings
          onto OVERALL ratings), by performing least-squares linear regression.
          Save the R^2 value and the parameters of this model as attributes of `self`.
+         The apartments are read only once, so any iterable (such as a generator) may be used.
 
         Arguments:
         apartments -- A sequence of apartments
-        >>> apartments = APARTMENT_DATA[:10]
+        >>> apartments = apartment_data()[:10]
         >>> r = LinearRegression()
         >>> r.train(apartments)
         >>> round(r._a,1)
         68.6
         >>> round(r._b,1)
         4.6
+        >>> r.train(a for a in apartments)
+        >>> round(r._a,1), round(r._b,1), r._n
+        (68.6, 4.6, 10)
+        >>> flat = [ApartmentBuilding('PRIVATE', 1, 2000, [Review('COSMETIC', c), Review('OVERALL', 70)]) for c in (1.0, 2.0)]
+        >>> r.train(flat)
+        >>> r.predict(flat[0]), r._r_squared
+        (70.0, 0)
+        """
+        self._reset_statistics()
+        self._accumulate(apartments)
+        self._fit()
+
+    def partial_fit(self, apartments: Iterable[ApartmentBuilding]) -> None:
+        """Update the model with a new batch of `apartments`, without revisiting the apartments
+        it was trained on before. The result is the same as training on all the apartments at once.
+
+        Arguments:
+        apartments -- A sequence of apartments
+        >>> r = LinearRegression()
+        >>> r.partial_fit(apartment_data()[:4])
+        >>> r.partial_fit(apartment_data()[4:10])
+        >>> round(r._a,1), round(r._b,1), r._n
+        (68.6, 4.6, 10)
+        >>> r = LinearRegression()
+        >>> r.partial_fit(apartment_data()[:1])
+        >>> r._n, r._a == apartment_data()[0].apartment_overall_rating(), r._b
+        (1, True, 0)
+        >>> r.partial_fit(apartment_data()[1:10])
+        >>> round(r._a,1), round(r._b,1), r._n
+        (68.6, 4.6, 10)
+        """
+        self._accumulate(apartments)
+        self._fit()
+
+    def merge(self, other: LinearRegression) -> None:
+        """Combine the statistics of `other`, a model trained on a separate set of apartments,
+        into this model. The result is the same as training on both sets of apartments at once.
+
+        Arguments:
+        other -- A LinearRegression trained on different apartments
+        >>> r = LinearRegression()
+        >>> r.train(apartment_data()[:6])
+        >>> s = LinearRegression()
+        >>> s.train(apartment_data()[6:10])
+        >>> r.merge(s)
+        >>> round(r._a,1), round(r._b,1), r._n
+        (68.6, 4.6, 10)
         """
-        mean_x = sum([a.apartment_cosmetic_rating() for a in apartments])/len(apartments)
-        mean_y = sum([a.apartment_overall_rating() for a in apartments])/len(apartments)
+        self._merge_statistics(other)
+        self._fit()
+
+    def _merge_statistics(self, other: LinearRegression) -> None:
+        """Combine the running statistics of `other` into this model's, without refitting it."""
+        if other._n == 0:
+            return
+
+        n = self._n + other._n
+        dx = other._mean_x - self._mean_x
+        dy = other._mean_y - self._mean_y
+        weight = self._n * other._n / n
 
-        s_xx = sum([(a.apartment_cosmetic_rating() - mean_x)**2 for a in apartments])
-        s_yy = sum([(a.apartment_overall_rating() - mean_y)**2 for a in apartments])
-        s_xy = sum([(a.apartment_cosmetic_rating() - mean_x) * (a.apartment_overall_rating() - mean_y) for a in apartments])
+        self._s_xx += other._s_xx + dx * dx * weight
+        self._s_yy += other._s_yy + dy * dy * weight
+        self._s_xy += other._s_xy + dx * dy * weight
+        self._mean_x += dx * other._n / n
+        self._mean_y += dy * other._n / n
+        self._n = n
 
-        self._b = s_xy/s_xx
-        self._a = mean_y - (self._b * mean_x)
+    def save(self, path: str) -> None:
+        """Save the parameters and running statistics of the model to the file at `path`."""
+        with open(path, 'wb') as f:
+            f.write(LR_FORMAT.pack(LR_MAGIC, MODEL_VERSION, self._n, self._mean_x, self._mean_y, self._s_xx,
+                                   self._s_yy, self._s_xy, self._a, self._b, self._r_squared))
 
-        self._r_squared = s_xy**2/(s_xx * s_yy)
+    @staticmethod
+    def load(path: str) -> LinearRegression:
+        """Return the model saved in the file at `path`. It can be used for predictions
+        straight away, and can be updated with `partial_fit` or `merge`.
+        >>> import os, tempfile
+        >>> r = LinearRegression()
+        >>> r.train(apartment_data()[:10])
+        >>> path = os.path.join(tempfile.mkdtemp(), 'lr.model')
+        >>> r.save(path)
+        >>> s = LinearRegression.load(path)
+        >>> (s._a, s._b, s._r_squared) == (r._a, r._b, r._r_squared)
+        True
+        """
+        with open(path, 'rb') as f:
+            data = f.read(LR_FORMAT.size)
+        if len(data) != LR_FORMAT.size:
+            raise ValueError(f'{path} is not a linear regression model file')
+        magic, version, *values = LR_FORMAT.unpack(data)
+        if magic != LR_MAGIC or version != MODEL_VERSION:
+            raise ValueError(f'{path} is not a linear regression model file')
+
+        model = LinearRegression()
+        (model._n, model._mean_x, model._mean_y, model._s_xx, model._s_yy, model._s_xy,
+         model._a, model._b, model._r_squared) = values
+        return model
 
     def predict(self, apartment: ApartmentBuilding) -> float:
         """Use the parameters of the regression model to predict an overall rating for
@@ -133,7 +677,16 @@ class LinearRegression:
         >>> round(r.predict(apartment), 1)
         23
         """
-        return self._a + (self._b * apartment.apartment_cosmetic_rating())
+        key = apartment.apartment_cosmetic_rating()
+        prediction = self._cache.get(key)
+        if prediction is None:
+            prediction = self._a + (self._b * key)
+            self._cache.put(key, prediction)
+        return prediction
+
+    def cache_info(self) -> dict[str, float]:
+        """Return the hit and miss statistics of the prediction cache."""
+        return self._cache.info()
 
     def make_predictions(self, apartments: list[ApartmentBuilding]) -> dict[ApartmentBuilding, float]:
         """Return the predicted rating of `apartments`.  Note
@@ -146,7 +699,7 @@ class LinearRegression:
 
         Arguments:
         apartments -- A list of apartments to be reviewed
-        >>> apartments = APARTMENT_DATA[:10]
+        >>> apartments = apartment_data()[:10]
         >>> r = LinearRegression()
         >>> r._a = 1
         >>> r._b = 2
@@ -161,13 +714,178 @@ class LinearRegression:
         return predicted_ratings
 
 
+##################################
+# Multiple Linear Regression
+##################################
+WARD = 'WARD'
+YEAR = 'YEAR'
+
+class MultipleLinearRegression:
+    """A least-squares linear regression model that predicts the OVERALL rating of an apartment
+    from several of its features: any of its COSMETIC, MODERATE RISK and HIGH RISK ratings,
+    its WARD and its YEAR of construction.
+    The features of all the apartments are packed once into a single row-major array of
+    floats (the design matrix). The model is fitted by solving the normal equations of the
+    centred features with a Cholesky factorisation; centring keeps the equations well
+    conditioned even though years are much larger than ratings.
+    >>> r = MultipleLinearRegression([COSMETIC])
+    >>> r.train(apartment_data()[:10])
+    >>> round(r.intercept, 1), round(r.coefficients[COSMETIC], 1)
+    (68.6, 4.6)
+    >>> r = MultipleLinearRegression()
+    >>> r.train(apartment_data())
+    >>> round(r.r_squared, 2)
+    1.0
+    """
+    _features: list[str]
+    _intercept: float
+    _coefficients: list[float]
+    _r_squared: float
+
+    def __init__(self, features: tuple[str, ...] = (COSMETIC, MODERATE_RISK, HIGH_RISK, WARD, YEAR)) -> None:
+        """Return a MultipleLinearRegression abstraction that uses the given features."""
+        assert len(features) > 0 and all(f in (COSMETIC, MODERATE_RISK, HIGH_RISK, WARD, YEAR) for f in features), "features must be 'COSMETIC', 'MODERATE RISK', 'HIGH RISK', 'WARD' or 'YEAR'"
+        self._features = list(features)
+        self._intercept = 0
+        self._coefficients = [0] * len(self._features)
+        self._r_squared = 0
+
+    @property
+    def intercept(self) -> float:
+        return self._intercept
+
+    @property
+    def coefficients(self) -> dict[str, float]:
+        """Return the coefficient of each feature."""
+        return dict(zip(self._features, self._coefficients))
+
+    @property
+    def r_squared(self) -> float:
+        return self._r_squared
+
+    def _design_matrix(self, apartments) -> array:
+        """Return the features of `apartments` packed row by row into one array of floats."""
+        matrix = array('d')
+        if isinstance(apartments, ApartmentTable):
+            columns = []
+            for f in self._features:
+                if f == WARD:
+                    columns.append(apartments.wards)
+                elif f == YEAR:
+                    columns.append(apartments.years)
+                else:
+                    columns.append(apartments.column(f))
+            for row in zip(*columns):
+                matrix.extend(row)
+            return matrix
+
+        for a in apartments:
+            for f in self._features:
+                if f == WARD:
+                    matrix.append(a.ward)
+                elif f == YEAR:
+                    matrix.append(a.year)
+                else:
+                    matrix.append(a.apartment_rating(f))
+        return matrix
+
+    def train(self, apartments: list[ApartmentBuilding]) -> None:
+        """Fit the model to `apartments` by least squares and save its coefficients and R^2.
+
+        Arguments:
+        apartments -- A sequence of apartments (or an ApartmentTable)
+        """
+        if isinstance(apartments, ApartmentTable):
+            ys = apartments.column(OVERALL)
+        else:
+            ys = array('d', [a.apartment_overall_rating() for a in apartments])
+        x = self._design_matrix(apartments)
+        n = len(ys)
+        p = len(self._features)
+
+        # means of each feature and of the overall ratings
+        means = [sum(x[j::p]) / n for j in range(p)]
+        mean_y = sum(ys) / n
+
+        # normal equations (X^T X) b = X^T y of the centred data
+        xtx = [[0.0] * p for _ in range(p)]
+        xty = [0.0] * p
+        for i in range(n):
+            row = [x[i * p + j] - means[j] for j in range(p)]
+            dy = ys[i] - mean_y
+            for j in range(p):
+                xty[j] += row[j] * dy
+                for k in range(j + 1):
+                    xtx[j][k] += row[j] * row[k]
+
+        self._coefficients = _cholesky_solve(xtx, xty)
+        self._intercept = mean_y - sum(b * m for b, m in zip(self._coefficients, means))
+
+        s_yy = sum((y - mean_y) ** 2 for y in ys)
+        sse = sum((y - predicted) ** 2 for y, predicted in zip(ys, self._predict_matrix(x)))
+        self._r_squared = 1 - sse / s_yy
+
+    def _predict_matrix(self, x: array) -> list[float]:
+        """Return the prediction for every row of the packed design matrix `x`."""
+        p = len(self._features)
+        return [self._intercept + sum(b * v for b, v in zip(self._coefficients, x[i:i + p])) for i in range(0, len(x), p)]
+
+    def predict(self, apartment: ApartmentBuilding) -> float:
+        """Use the parameters of the regression model to predict an overall rating for `apartment`."""
+        return self._predict_matrix(self._design_matrix([apartment]))[0]
+
+    def make_predictions(self, apartments: list[ApartmentBuilding]) -> dict[ApartmentBuilding, float]:
+        """Return the predicted rating of each apartment in `apartments`, computed in one
+        batch over their packed design matrix.
+        >>> r = MultipleLinearRegression()
+        >>> r.train(apartment_data())
+        >>> predictions = r.make_predictions(testing_data())
+        >>> round(calculate_mse(predictions), 1)
+        0.3
+        """
+        predicted_ratings = {}
+
+        for a, p in zip(apartments, self._predict_matrix(self._design_matrix(apartments))):
+            predicted_ratings[a] = p
+
+        return predicted_ratings
+
+
+def _cholesky_solve(a: list[list[float]], b: list[float]) -> list[float]:
+    """Solve a x = b for x, where `a` is a symmetric positive definite matrix of which only
+    the lower triangle is used, by Cholesky factorisation a = L L^T.
+    >>> [round(v, 6) for v in _cholesky_solve([[4.0, 0.0], [2.0, 3.0]], [6.0, 5.0])]
+    [1.0, 1.0]
+    """
+    n = len(b)
+    lower = [[0.0] * n for _ in range(n)]
+    for i in range(n):
+        for j in range(i + 1):
+            s = a[i][j] - sum(lower[i][k] * lower[j][k] for k in range(j))
+            if i == j:
+                if s <= a[i][i] * 1e-12:  # no variation left once the earlier features are accounted for
+                    raise ValueError('the features are linearly dependent, so the model cannot be fitted')
+                lower[i][i] = s ** 0.5
+            else:
+                lower[i][j] = s / lower[j][j]
+
+    # forward substitution for L z = b, then back substitution for L^T x = z
+    z = [0.0] * n
+    for i in range(n):
+        z[i] = (b[i] - sum(lower[i][k] * z[k] for k in range(i))) / lower[i][i]
+    x = [0.0] * n
+    for i in reversed(range(n)):
+        x[i] = (z[i] - sum(lower[k][i] * x[k] for k in range(i + 1, n))) / lower[i][i]
+    return x
+
 def calculate_mse(predictions: dict[ApartmentBuilding, float]) -> float:
     """Calculate the mean squared error between predicted ratings and actual ratings
 
      Arguments:
      predictions -- A dictonary wherein keys are apartment buildings (containing actual
      rating data) and values are predictions of the overall ratings for these buildings.
-      >>> apartments = APARTMENT_DATA[:10]
+     For the MAE, RMSE and R^2 as well, use evaluation.RegressionMetrics.
+      >>> apartments = apartment_data()[:10]
       >>> training = [ApartmentBuilding('SOCIAL HOUSING', 1, 1973, [Review('MODERATE RISK', 6), Review('COSMETIC', 1.6), Review('OVERALL', 91)]), ApartmentBuilding('SOCIAL HOUSING', 1, 1973, [Review('MODERATE RISK', 6), Review('COSMETIC', 1.0), Review('OVERALL', 86)]), ApartmentBuilding('SOCIAL HOUSING', 1, 1973, [Review('MODERATE RISK', 6), Review('COSMETIC', 2.1), Review('OVERALL', 56)])]
       >>> r = NearestNeighbour(training)
       >>> predictions = r.make_predictions(apartments)
@@ -180,12 +898,131 @@ def calculate_mse(predictions: dict[ApartmentBuilding, float]) -> float:
       >>> round(calculate_mse(predictions),1)
       5310.2
       """
-    sse = sum([(a.apartment_overall_rating() - p)**2 for a, p in predictions.items()])
+    sse = sum((a.apartment_overall_rating() - p) ** 2 for a, p in predictions.items())
     mse = sse/len(predictions)
 
     return mse
 
 
+##################################
+# Parallel training and scoring
+##################################
+SHARD_SIZE = 10000  # apartments per shard; fixed so results do not depend on the number of workers
+
+_worker_model = None  # the model shared by every shard scored in a worker process
+
+
+def _shards(apartments: Iterable[ApartmentBuilding], shard_size: int) -> Iterable[list[ApartmentBuilding] | ApartmentTable]:
+    """Yield consecutive lists of at most `shard_size` apartments from `apartments`. The shards
+    of an ApartmentTable are sub-tables, so each one pickles only its own rows.
+    >>> [len(s) for s in _shards(apartment_data()[:25], 10)]
+    [10, 10, 5]
+    >>> [type(s).__name__ for s in _shards(ApartmentTable.from_apartments(apartment_data()[:25]), 10)]
+    ['ApartmentTable', 'ApartmentTable', 'ApartmentTable']
+    """
+    if isinstance(apartments, ApartmentTable):
+        for start in range(0, len(apartments), shard_size):
+            yield apartments[start:start + shard_size]
+        return
+
+    apartments = iter(apartments)
+    shard = list(islice(apartments, shard_size))
+    while len(shard) > 0:
+        yield shard
+        shard = list(islice(apartments, shard_size))
+
+
+def _train_shard(apartments: list[ApartmentBuilding]) -> LinearRegression:
+    """Return a LinearRegression holding the statistics of one shard of apartments."""
+    model = LinearRegression()
+    model._accumulate(apartments)
+    return model
+
+
+def _set_worker_model(model) -> None:
+    """Remember the model this worker process will use to score shards."""
+    global _worker_model
+    _worker_model = model
+
+
+def _predict_shard(apartments: list[ApartmentBuilding] | ApartmentTable, model=None) -> list[float]:
+    """Return the predictions of `model` (by default the worker's model) for one shard, in the
+    order of `apartments`."""
+    predictions = (_worker_model if model is None else model).make_predictions(apartments)
+    return [predictions[a] for a in apartments]
+
+
+def train_parallel(apartments: Iterable[ApartmentBuilding], workers: int = 1, shard_size: int = SHARD_SIZE) -> LinearRegression:
+    """Return a LinearRegression trained on `apartments`, with the work split into shards of
+    `shard_size` apartments across `workers` processes. The statistics of the shards are
+    merged in shard order, so the trained model is identical for any number of workers.
+
+    Arguments:
+    apartments -- A sequence of apartments
+    workers -- The number of worker processes to use
+    shard_size -- The number of apartments in each shard
+    >>> serial = train_parallel(apartment_data(), workers=1, shard_size=100)
+    >>> parallel = train_parallel(apartment_data(), workers=4, shard_size=100)
+    >>> (serial._a, serial._b, serial._r_squared) == (parallel._a, parallel._b, parallel._r_squared)
+    True
+    >>> round(parallel._a,1), round(parallel._b,1)
+    (51.5, 14.2)
+    >>> tiny_shards = train_parallel(apartment_data()[:50], workers=1, shard_size=1)
+    >>> round(tiny_shards._b, 1) == round(train_parallel(apartment_data()[:50], workers=1)._b, 1)
+    True
+    """
+    # the shards' statistics are merged first and the model is fitted once, at the end
+    model = LinearRegression()
+    if workers <= 1:
+        for shard in _shards(apartments, shard_size):
+            model._merge_statistics(_train_shard(shard))
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            for shard_model in executor.map(_train_shard, _shards(apartments, shard_size)):
+                model._merge_statistics(shard_model)
+    model._fit()
+    return model
+
+
+def predict_parallel(model, apartments: Iterable[ApartmentBuilding], workers: int = 1, shard_size: int = SHARD_SIZE) -> dict[ApartmentBuilding, float]:
+    """Return the predicted rating of each apartment in `apartments` using `model` (a trained
+    NearestNeighbour or LinearRegression), with the apartments split into shards of `shard_size`
+    across `workers` processes. The predictions are the same as `model.make_predictions`.
+
+    Arguments:
+    model -- A trained NearestNeighbour or LinearRegression
+    apartments -- A sequence of apartments to be rated
+    workers -- The number of worker processes to use
+    shard_size -- The number of apartments in each shard
+    >>> nn = NearestNeighbour(apartment_data()[40:])
+    >>> predict_parallel(nn, apartment_data()[:40], workers=3, shard_size=7) == nn.make_predictions(apartment_data()[:40])
+    True
+    >>> table = ApartmentTable.from_apartments(apartment_data()[:40])
+    >>> predict_parallel(nn, table, workers=3, shard_size=7) == nn.make_predictions(table)
+    True
+    """
+    # the shards are copies (sub-tables, or apartments pickled for a worker), so the ratings
+    # are matched up with the original apartments by position
+    originals = iter(apartments) if isinstance(apartments, ApartmentTable) else None
+    predicted_ratings = {}
+
+    def match(shard, ratings: list[float]) -> None:
+        for p, a in zip(ratings, shard if originals is None else originals):
+            predicted_ratings[a] = p
+
+    if workers <= 1:
+        for shard in _shards(apartments, shard_size):
+            match(shard, _predict_shard(shard, model))
+        return predicted_ratings
+
+    # the model is sent to each worker once
+    shards = list(_shards(apartments, shard_size))
+    with ProcessPoolExecutor(max_workers=workers, initializer=_set_worker_model, initargs=(model,)) as executor:
+        for shard, ratings in zip(shards, executor.map(_predict_shard, shards)):
+            match(shard, ratings)
+    return predicted_ratings
+
+
 if __name__ == "__main__":
     import doctest
     doctest.testmod()
@@ -193,12 +1030,12 @@ if __name__ == "__main__":
     # Uncomment the lines below to train and visualize a regression
 
     # c = LinearRegression()
-    # c.train(APARTMENT_DATA)
-    # ratings = c.make_predictions(TESTING_DATA)
+    # c.train(apartment_data())
+    # ratings = c.make_predictions(testing_data())
     # print(f'MSE for regression is {calculate_mse(ratings)}')
     #
-    # xs = [t.apartment_cosmetic_rating() for t in TESTING_DATA]
-    # ys = [t.apartment_overall_rating() for t in TESTING_DATA]
+    # xs = [t.apartment_cosmetic_rating() for t in testing_data()]
+    # ys = [t.apartment_overall_rating() for t in testing_data()]
     #
     # plt.plot(xs, ys, 'ro')
     # plt.plot(xs, ratings.values(), 'bo')
@@ -209,8 +1046,8 @@ if __name__ == "__main__":
     # plt.plot(xs, ratings.values(), 'b')
     # plt.show()
     #
-    # c = NearestNeighbour(APARTMENT_DATA)
-    # ratings = c.make_predictions(TESTING_DATA)
+    # c = NearestNeighbour(apartment_data())
+    # ratings = c.make_predictions(testing_data())
     # print(f'MSE for nearest neighbour is {calculate_mse(ratings)}')
     #
     # plt.plot(xs, ys, 'ro')
@@ -1,29 +1,188 @@
+import io
 import os
 import csv
+import struct
+
+import numpy as np
 
 from abstractions import *
 
 DATA_DIRECTORY = 'datafolder/'
+USE_CACHE = False  # keep a binary copy of each dataset next to its csv file for fast reloading
+
+# A cache file starts with a header (magic bytes, format version, the modification
+# time and size of the csv file it was made from, and the number of rows),
+# followed by the columns of an ApartmentTable.
+CACHE_SUFFIX = '.cache'
+CACHE_HEADER = struct.Struct('<4sIqqq')
+CACHE_MAGIC = b'APTC'
+CACHE_VERSION = 1
+
+# The columns of a csv file, as read by the fast engine, which parses the property type
+# as a string and the other columns as numbers
+FAST_ROW_DTYPE = np.dtype([('year', np.intc), ('type', 'U14'), ('ward', np.intc), ('cosmetic', np.float64),
+                           ('moderate', np.float64), ('high', np.float64), ('overall', np.float64)])
+
+def _read_fast_table(path):
+    """Parse the csv file at `path` into an ApartmentTable with NumPy's loadtxt, which reads
+    every row into a structured array in compiled code, and copy its columns into the table
+    in bulk. This is much faster than reading row by row, but only handles files without
+    quoted fields or blank lines in which every row has as many fields as the header and
+    every property type is known, so it returns None for any other file."""
+    with open(path) as csvfile:
+        text = csvfile.read()
+    if '"' in text:
+        return None
+
+    _, _, body = text.partition('\n')
+    if '\r' in body:
+        body = body.replace('\r\n', '\n')
+    body = body.strip('\n')
+    if body == '':
+        return ApartmentTable()
+    if '\n\n' in body:
+        return None  # loadtxt would skip the blank lines
 
-def load_data(apartments_dataset):
+    try:
+        rows = np.loadtxt(io.StringIO(body), delimiter=',', dtype=FAST_ROW_DTYPE, comments=None, ndmin=1)
+    except ValueError:
+        return None  # a row has the wrong number of fields, or a field is not a number
+
+    type_codes = np.full(len(rows), -1, dtype=np.int8)
+    for code, name in enumerate(APARTMENT_TYPES):
+        type_codes[rows['type'] == name] = code
+    if (type_codes < 0).any():
+        return None
+    return ApartmentTable.from_buffers(type_codes, *[np.ascontiguousarray(rows[name]) for name in
+                                                     ('ward', 'year', 'cosmetic', 'moderate', 'high', 'overall')])
+
+def _read_csv_table(path):
+    """Parse the csv file at `path` into an ApartmentTable, one row at a time."""
+    table = ApartmentTable()
+    with open(path) as csvfile:
+        apartment_data = csv.reader(csvfile, delimiter=',')
+        next(apartment_data)  # skip the header
+        for row in apartment_data:
+            table.append(row[1], int(row[2]), int(row[0]), float(row[3]), float(row[4]), float(row[5]), float(row[6]))
 
-    types = ['COSMETIC', 'MODERATE RISK', 'HIGH RISK', 'OVERALL']
-    apartments = []
+    return table
+
+def _read_cache(path):
+    """Return the table cached for the csv file at `path`, or None if there is no cache
+    or it was made from a different version of the file."""
+    stat = os.stat(path)
+    try:
+        with open(path + CACHE_SUFFIX, 'rb') as cachefile:
+            header = cachefile.read(CACHE_HEADER.size)
+            if len(header) != CACHE_HEADER.size:
+                return None
+            magic, version, mtime, size, rows = CACHE_HEADER.unpack(header)
+            if (magic, version, mtime, size) != (CACHE_MAGIC, CACHE_VERSION, stat.st_mtime_ns, stat.st_size):
+                return None
+            return ApartmentTable.fromfile(cachefile, rows)
+    except (OSError, EOFError):
+        return None
+
+def _write_cache(path, table):
+    """Cache `table`, which was parsed from the csv file at `path`, next to that file."""
+    stat = os.stat(path)
+    temp_path = f'{path}{CACHE_SUFFIX}.{os.getpid()}'
+    try:
+        with open(temp_path, 'wb') as cachefile:
+            cachefile.write(CACHE_HEADER.pack(CACHE_MAGIC, CACHE_VERSION, stat.st_mtime_ns, stat.st_size, len(table)))
+            table.tofile(cachefile)
+        os.replace(temp_path, path + CACHE_SUFFIX)  # so readers never see a partly written cache
+    except OSError:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+
+def load_table(apartments_dataset, cache=False, engine='fast'):
+    """Load `apartments_dataset` into a column-oriented ApartmentTable.
+    With the 'fast' engine the file is parsed in bulk, a column at a time; files the fast
+    engine cannot handle, and the 'csv' engine, use the csv module row by row.
+    If `cache` is true, a binary copy of the table is kept next to the csv file and
+    used instead of the csv file for as long as the csv file is not modified.
+    >>> load_table('testset.csv').column('COSMETIC') == load_table('testset.csv', engine='csv').column('COSMETIC')
+    True
+    """
+    assert engine in ('fast', 'csv'), "engine must be 'fast' or 'csv'"
+    path = os.path.join(DATA_DIRECTORY, apartments_dataset)
+    if cache:
+        table = _read_cache(path)
+        if table is not None:
+            return table
+
+    table = _read_fast_table(path) if engine == 'fast' else None
+    if table is None:
+        table = _read_csv_table(path)
+    if cache:
+        _write_cache(path, table)
+    return table
+
+def iter_apartments(apartments_dataset, chunk_size=None):
+    """Yield the apartments in `apartments_dataset` one at a time as the file is read, or,
+    if `chunk_size` is given, in lists of up to `chunk_size` apartments. Only one row
+    (or one chunk) is held in memory at a time.
+    >>> next(iter_apartments('testset.csv')).reviews
+    [Review('COSMETIC', 3.0), Review('MODERATE RISK', 2.56), Review('HIGH RISK', 2.62), Review('OVERALL', 87.0)]
+    >>> [len(chunk) for chunk in iter_apartments('testset.csv', chunk_size=300)]
+    [300, 300, 50]
+    """
+    assert chunk_size is None or (isinstance(chunk_size, int) and chunk_size > 0), "chunk_size must be a positive integer"
+    types = RATING_TYPES
+    chunk = []
     with open(os.path.join(DATA_DIRECTORY, apartments_dataset)) as csvfile:
         apartment_data = csv.reader(csvfile, delimiter=',')
-        line_no = 0
+        next(apartment_data, None)  # skip the header
         for row in apartment_data:
-            if line_no > 0:
-                reviews = []
-                count = 0
-                for i in [3,4,5,6]:
-                    reviews.append(Review(types[count], float(row[i])))
-                    count += 1
-                apartments.append(ApartmentBuilding(row[1], int(row[2]), int(row[0]), reviews))
-            line_no += 1
+            reviews = []
+            count = 0
+            for i in [3,4,5,6]:
+                reviews.append(Review(types[count], float(row[i])))
+                count += 1
+            apartment = ApartmentBuilding(row[1], int(row[2]), int(row[0]), reviews)
+            if chunk_size is None:
+                yield apartment
+            else:
+                chunk.append(apartment)
+                if len(chunk) == chunk_size:
+                    yield chunk
+                    chunk = []
+
+    if len(chunk) > 0:
+        yield chunk
+
+def load_data(apartments_dataset, cache=False):
+    """Load the apartments in `apartments_dataset` with `load_table`, which parses the file
+    in bulk, and return the ApartmentTable. It can be indexed, sliced and iterated like a
+    list of apartments, and its rows act as ApartmentBuilding objects that are only made
+    when they are used. If `cache` is true, the table is kept in (and read from) a binary
+    copy next to the csv file. To read ApartmentBuilding objects one at a time, use
+    `iter_apartments`.
+    >>> [repr(a.reviews) for a in load_data('testset.csv')[:3]] == [repr(a.reviews) for a in list(iter_apartments('testset.csv'))[:3]]
+    True
+    """
+    return load_table(apartments_dataset, cache=cache)
+
+# The datasets are only parsed the first time they are used, and then kept.
+_loaded = {}
 
-    return apartments
+def apartment_data():
+    """Return the apartments to TRAIN on, loading them on first use."""
+    if 'apartments.csv' not in _loaded:
+        _loaded['apartments.csv'] = load_data('apartments.csv', cache=USE_CACHE)
+    return _loaded['apartments.csv']
 
-APARTMENT_DATA = load_data('apartments.csv') #TRAIN on some apartment data
-TESTING_DATA = load_data('testset.csv') #TEST on a DIFFERENT set of apartment data
+def testing_data():
+    """Return the apartments to TEST on (a DIFFERENT set of apartment data), loading them on first use."""
+    if 'testset.csv' not in _loaded:
+        _loaded['testset.csv'] = load_data('testset.csv', cache=USE_CACHE)
+    return _loaded['testset.csv']
 
+def __getattr__(name):
+    """Load APARTMENT_DATA and TESTING_DATA when they are first imported or used."""
+    if name == 'APARTMENT_DATA':
+        return apartment_data()
+    if name == 'TESTING_DATA':
+        return testing_data()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
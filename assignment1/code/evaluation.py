@@ -0,0 +1,164 @@
+"""Regression metrics for rating predictions"""
+from __future__ import annotations
+from array import array
+from math import sqrt
+from typing import Iterable, Optional
+
+import numpy as np
+
+from abstractions import ApartmentBuilding, ApartmentTable, OVERALL
+
+
+class RegressionMetrics:
+    """Error measures between actual and predicted ratings, accumulated over one or more
+    batches so that a large holdout set can be evaluated a chunk at a time.
+    Each batch is reduced with NumPy: its error sums and the mean and spread of its actual
+    ratings are merged into running totals, and its absolute errors are kept for the median.
+    One RegressionMetrics is kept per ward when wards are given.
+    >>> m = RegressionMetrics()
+    >>> m.update([80, 90, 70], [82, 87, 70], wards=[1, 2, 1])
+    >>> m.update([60], [66], wards=[2])
+    >>> m.count, m.mse, m.mae, m.median_absolute_error
+    (4, 12.25, 2.75, 2.5)
+    >>> round(m.rmse, 2), round(m.r_squared, 3)
+    (3.5, 0.902)
+    >>> sorted(m.by_ward()), m.by_ward()[1].mse
+    ([1, 2], 2.0)
+    >>> m.by_ward()[2].count, m.by_ward()[2].median_absolute_error
+    (2, 4.5)
+    """
+    _n: int
+    _sum_squared_error: float
+    _sum_absolute_error: float
+    _mean_actual: float
+    _s_actual: float
+    _absolute_errors: list[np.ndarray]
+    _wards: dict[int, RegressionMetrics]
+
+    def __init__(self) -> None:
+        """Return a RegressionMetrics that has not seen any ratings."""
+        self._n = 0
+        self._sum_squared_error = 0.0
+        self._sum_absolute_error = 0.0
+        self._mean_actual = 0.0  # mean of the actual ratings
+        self._s_actual = 0.0  # sum of squared deviations of the actual ratings from their mean
+        self._absolute_errors = []  # the absolute errors of each batch
+        self._wards = {}
+
+    def _merge(self, n: int, sum_squared_error: float, sum_absolute_error: float, mean_actual: float,
+               s_actual: float, absolute_errors: np.ndarray) -> None:
+        """Fold the totals of a batch of `n` ratings into the metrics. The spreads of the
+        actual ratings are combined with the parallel form of Welford's update."""
+        total = self._n + n
+        delta = mean_actual - self._mean_actual
+        self._s_actual += s_actual + delta ** 2 * self._n * n / total
+        self._mean_actual += delta * n / total
+        self._n = total
+        self._sum_squared_error += sum_squared_error
+        self._sum_absolute_error += sum_absolute_error
+        self._absolute_errors.append(absolute_errors)
+
+    def update(self, actuals: Iterable[float], predictions: Iterable[float], wards: Optional[Iterable[int]] = None) -> None:
+        """Add a batch of aligned actual ratings, predicted ratings and (optionally) wards."""
+        actuals, predictions = _as_array(actuals), _as_array(predictions)
+        n = min(len(actuals), len(predictions))
+        if n == 0:
+            return
+        actuals, predictions = actuals[:n], predictions[:n]
+        errors = actuals - predictions
+        squared_errors = errors ** 2
+        absolute_errors = np.abs(errors)
+        mean_actual = actuals.mean()
+        self._merge(n, float(squared_errors.sum()), float(absolute_errors.sum()), float(mean_actual),
+                    float(((actuals - mean_actual) ** 2).sum()), absolute_errors)
+        if wards is None:
+            return
+
+        # sum each measure per ward with bincount over the position of each row's ward
+        keys, ward_of_row = np.unique(_as_array(wards, dtype=int)[:n], return_inverse=True)
+        counts = np.bincount(ward_of_row)
+        sums_squared = np.bincount(ward_of_row, weights=squared_errors)
+        sums_absolute = np.bincount(ward_of_row, weights=absolute_errors)
+        means = np.bincount(ward_of_row, weights=actuals) / counts
+        spreads = np.bincount(ward_of_row, weights=(actuals - means[ward_of_row]) ** 2)
+        by_ward = np.split(absolute_errors[np.argsort(ward_of_row, kind='stable')], np.cumsum(counts)[:-1])
+        for i, ward in enumerate(keys.tolist()):
+            if ward not in self._wards:
+                self._wards[ward] = RegressionMetrics()
+            self._wards[ward]._merge(int(counts[i]), float(sums_squared[i]), float(sums_absolute[i]), float(means[i]),
+                                     float(spreads[i]), by_ward[i])
+
+    def update_predictions(self, predictions: dict[ApartmentBuilding, float], by_ward: bool = False) -> None:
+        """Add a batch of predictions in the form returned by `make_predictions`, whose keys
+        are apartment buildings holding the actual ratings."""
+        apartments = predictions.keys()
+        actuals = (a.apartment_overall_rating() for a in apartments)
+        wards = (a.ward for a in apartments) if by_ward else None
+        self.update(actuals, predictions.values(), wards)
+
+    @property
+    def count(self) -> int:
+        return self._n
+
+    @property
+    def mse(self) -> float:
+        """Return the mean squared error."""
+        return self._sum_squared_error / self._n
+
+    @property
+    def rmse(self) -> float:
+        """Return the root mean squared error."""
+        return sqrt(self.mse)
+
+    @property
+    def mae(self) -> float:
+        """Return the mean absolute error."""
+        return self._sum_absolute_error / self._n
+
+    @property
+    def r_squared(self) -> float:
+        """Return the coefficient of determination of the predictions."""
+        return 1 - self._sum_squared_error / self._s_actual
+
+    @property
+    def median_absolute_error(self) -> float:
+        """Return the median of the absolute errors."""
+        return float(np.median(np.concatenate(self._absolute_errors)))
+
+    def by_ward(self) -> dict[int, RegressionMetrics]:
+        """Return the metrics of each ward, if wards were given."""
+        return self._wards
+
+    def summary(self) -> dict[str, float]:
+        """Return every metric in a dictionary.
+        >>> m = RegressionMetrics()
+        >>> m.update([1, 2, 3], [1, 2, 4])
+        >>> m.summary()['mae']
+        0.3333333333333333
+        """
+        return {'count': self.count, 'mse': self.mse, 'rmse': self.rmse, 'mae': self.mae,
+                'r_squared': self.r_squared, 'median_absolute_error': self.median_absolute_error}
+
+
+def _as_array(values: Iterable, dtype=float) -> np.ndarray:
+    """Return `values` as a NumPy array, without a copy when they are already in a buffer."""
+    if isinstance(values, (array, np.ndarray, list, tuple)):
+        return np.asarray(values, dtype=dtype)
+    return np.fromiter(values, dtype=dtype)
+
+
+def evaluate(model, apartments: Iterable[list[ApartmentBuilding]], by_ward: bool = False) -> RegressionMetrics:
+    """Return the metrics of `model`'s predictions over `apartments`, which is an iterable
+    of batches of apartments (for example `data.iter_apartments(name, chunk_size=...)`).
+    Only one batch of predictions is held in memory at a time.
+    ApartmentTable batches are read straight from their columns.
+    """
+    metrics = RegressionMetrics()
+    for batch in apartments:
+        predictions = model.make_predictions(batch)
+        if isinstance(batch, ApartmentTable):
+            wards = batch.wards if by_ward else None
+            metrics.update(batch.column(OVERALL), [predictions[a] for a in batch], wards)
+        else:
+            metrics.update_predictions(predictions, by_ward)
+    return metrics
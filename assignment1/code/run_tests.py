@@ -0,0 +1,81 @@
+"""Headless, parallel runner for the tests in autograder.py.
+
+Every test_* function in autograder.py is run in its own worker process with the
+non-interactive Agg plotting backend, so plt.show() returns immediately. The wall time,
+peak resident memory and outcome of each test are written out as a JSON report.
+
+Run from this directory with, for example:
+    python run_tests.py --workers 4 --output report.json
+The exit status is 1 if any test failed.
+"""
+import os
+os.environ['MPLBACKEND'] = 'Agg'  # before matplotlib is imported here or in any worker
+
+import argparse
+import json
+import resource
+import sys
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor
+
+TEST_MODULE = 'autograder'
+
+
+def discover_tests(module_name: str = TEST_MODULE) -> list[str]:
+    """Return the names of the test functions in `module_name`, in the order they are defined."""
+    module = __import__(module_name)
+    return [name for name, value in vars(module).items() if name.startswith('test_') and callable(value)]
+
+
+def run_test(name: str, module_name: str = TEST_MODULE) -> dict:
+    """Run one test function and return its outcome, wall time and the peak resident
+    memory of the process running it. Each test gets a fresh process, so the peak
+    memory belongs to that test (plus the cost of importing the modules it uses)."""
+    module = __import__(module_name)
+    start = time.perf_counter()
+    try:
+        getattr(module, name)()
+        outcome, error = 'passed', None
+    except AssertionError:
+        outcome, error = 'failed', traceback.format_exc()
+    except Exception:
+        outcome, error = 'error', traceback.format_exc()
+    seconds = time.perf_counter() - start
+
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == 'darwin':  # reported in bytes on macOS and in kilobytes elsewhere
+        peak_rss //= 1024
+    return {'test': name, 'outcome': outcome, 'seconds': seconds, 'peak_rss_kb': peak_rss, 'error': error}
+
+
+def run_tests(names: list[str], workers: int) -> list[dict]:
+    """Run the tests called `names` across `workers` processes, one fresh process per
+    test, and return their results in the same order as `names`."""
+    with ProcessPoolExecutor(max_workers=workers, max_tasks_per_child=1) as executor:
+        return list(executor.map(run_test, names))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('-k', dest='pattern', default='', help='only run tests whose name contains this text')
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help='number of worker processes')
+    parser.add_argument('--output', help='write the JSON report to this file instead of printing it')
+    args = parser.parse_args()
+
+    names = [name for name in discover_tests() if args.pattern in name]
+    start = time.perf_counter()
+    results = run_tests(names, args.workers)
+    report = {
+        'passed': sum(r['outcome'] == 'passed' for r in results),
+        'failed': sum(r['outcome'] != 'passed' for r in results),
+        'seconds': time.perf_counter() - start,
+        'tests': results,
+    }
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+    else:
+        print(json.dumps(report, indent=2))
+    sys.exit(1 if report['failed'] > 0 else 0)
@@ -0,0 +1,112 @@
+"""A KD-tree spatial index over points with any number of coordinates"""
+from __future__ import annotations
+from array import array
+from heapq import heappush, heappushpop
+from typing import Sequence
+
+EUCLIDEAN = 'euclidean'
+MANHATTAN = 'manhattan'
+
+
+class PointKDTree:
+    """A KD-tree over a fixed list of points, used to find the nearest points to a query
+    without comparing it against every point.
+    The tree is stored in flat arrays rather than node objects: node i holds point
+    `_points[_indices[i]]`, splits on coordinate `_axes[i]`, and has children `_left[i]` and
+    `_right[i]` (-1 when there is no child). On its split axis, no point in the left
+    subtree has a larger coordinate than the node, and no point in the right subtree
+    has a smaller one. Splitting at the median keeps the tree balanced even when many
+    points share a coordinate, as coarse ratings often do.
+    >>> tree = PointKDTree([(1.0, 1.0), (2.0, 2.0), (3.0, 1.0), (1.5, 3.0)])
+    >>> tree.nearest((2.9, 1.2), 2)
+    [(2, 0.22360679774997896), (1, 1.2041594578792296)]
+    >>> tree.nearest((2.9, 1.2), 1, MANHATTAN)
+    [(2, 0.30000000000000004)]
+    """
+    _dimensions: int
+    _points: list[tuple[float, ...]]
+    _indices: array
+    _axes: array
+    _left: array
+    _right: array
+    _root: int
+
+    def __init__(self, points: Sequence[Sequence[float]]) -> None:
+        """Build a KD-tree over `points`, which must all have the same number of coordinates."""
+        self._points = [tuple(p) for p in points]
+        self._dimensions = len(self._points[0]) if len(self._points) > 0 else 0
+        assert all(len(p) == self._dimensions for p in self._points), "points must all have the same number of coordinates"
+        self._indices = array('l')  # position in `points` of the point at each node
+        self._axes = array('b')
+        self._left = array('l')
+        self._right = array('l')
+        self._root = self._build(list(range(len(self._points))), 0)
+
+    def _build(self, indices: list[int], depth: int) -> int:
+        """Build the subtree holding the points at `indices`, split on the median of the
+        coordinate chosen by `depth`, and return the node at its root (-1 if empty)."""
+        if len(indices) == 0:
+            return -1
+
+        axis = depth % self._dimensions
+        indices.sort(key=lambda i: (self._points[i][axis], i))
+        middle = len(indices) // 2
+
+        node = len(self._indices)
+        self._indices.append(indices[middle])
+        self._axes.append(axis)
+        self._left.append(-1)
+        self._right.append(-1)
+        self._left[node] = self._build(indices[:middle], depth + 1)
+        self._right[node] = self._build(indices[middle + 1:], depth + 1)
+        return node
+
+    def __len__(self) -> int:
+        return len(self._points)
+
+    def nearest(self, query: Sequence[float], k: int = 1, metric: str = EUCLIDEAN) -> list[tuple[int, float]]:
+        """Return (position, distance) pairs for the `k` points nearest to `query`, nearest
+        first, where position is the point's position in the list the tree was built from.
+        Points at equal distances are ordered by position.
+        `metric` is either EUCLIDEAN or MANHATTAN.
+        """
+        assert metric in (EUCLIDEAN, MANHATTAN), "metric must be 'euclidean' or 'manhattan'"
+        assert isinstance(k, int) and k > 0, "k must be a positive integer"
+        query = tuple(query)
+        assert len(query) == self._dimensions, "query must have one coordinate per dimension"
+        euclidean = metric == EUCLIDEAN
+
+        best = []  # max-heap of the k nearest so far, as (-distance, -position)
+        stack = [self._root] if self._root != -1 else []
+        plane_distances = [0.0] * len(stack)  # lower bound on the distance to each subtree
+        while len(stack) > 0:
+            node = stack.pop()
+            bound = plane_distances.pop()
+            if len(best) == k and bound > -best[0][0]:
+                continue
+
+            position = self._indices[node]
+            point = self._points[position]
+            if euclidean:
+                distance = sum((q - p) ** 2 for q, p in zip(query, point))  # squared until the end
+            else:
+                distance = sum(abs(q - p) for q, p in zip(query, point))
+            if len(best) < k:
+                heappush(best, (-distance, -position))
+            elif (-distance, -position) > best[0]:
+                heappushpop(best, (-distance, -position))
+
+            axis = self._axes[node]
+            offset = query[axis] - point[axis]
+            near, far = (self._left[node], self._right[node]) if offset < 0 else (self._right[node], self._left[node])
+            if far != -1:
+                stack.append(far)
+                plane_distances.append(max(bound, offset ** 2 if euclidean else abs(offset)))
+            if near != -1:
+                stack.append(near)
+                plane_distances.append(bound)
+
+        neighbours = sorted((-d, -i) for d, i in best)
+        if euclidean:
+            return [(i, d ** 0.5) for d, i in neighbours]
+        return [(i, d) for d, i in neighbours]
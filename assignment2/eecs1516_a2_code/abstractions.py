@@ -77,6 +77,10 @@ class Apartment:
     def score_subset(self) -> tuple[float, float, float]:
         return self._score_subset
 
+    @property
+    def location(self) -> Location:
+        return self._loc
+
     def get_cosmetic(self) -> float:
         return self._score_subset[0]
 
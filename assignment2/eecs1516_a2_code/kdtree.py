@@ -3,12 +3,27 @@ from typing import Optional, Tuple
 
 from abstractions import Apartment, ApartmentReader
 
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+from heapq import heappush, heappushpop
 import math  # This may be useful!
+import mmap
+import multiprocessing
 import pickle  # for test cases in doctests
+import struct
+
+PREDICT_CHUNK_SIZE = 10000  # queries per chunk handed to a worker process by KDTree.predict
+
+_worker_tree = None  # the tree shared by every chunk of queries classified in a worker process
+
+TREE_FILE_VERSION = 1
+TREE_FILE_MAGIC = b'KDTR'
+TREE_FILE_HEADER = struct.Struct('<4sIqqq')  # magic, version, number of nodes, payload bytes, average build year
 
 class _KDTNode:
-    """A node to store some data in a KD-tree. A KD-tree is a binary tree
-    that will be built of these nodes.
+    """A node to store some data in a KD-tree. Trees were once built of these
+    nodes; KDTree now keeps its nodes in flat arrays, and this class remains so
+    that trees pickled in the old layout (such as kdtree.pkl) can still be loaded.
 
     === Attributes ===
     Information stored in a node:
@@ -46,7 +61,8 @@ class _KDTNode:
         >>> round(node.distance(3, 1, 1),1)
         2.3
         """
-        pass  # Replace this!
+        c0, m0, h0 = self._apartment.score_subset
+        return math.sqrt((c0 - c) ** 2 + (m0 - m) ** 2 + (h0 - h) ** 2)
 
     #Useful getter and setter methods below!
     @property
@@ -78,60 +94,249 @@ class _KDTNode:
         self._pivot = value
 
 
+class _MappedApartments:
+    """The apartments stored at the nodes of a tree file, read from its payload on demand.
+    Each apartment's record is its year, owner, latitude, longitude and overall score
+    as tab-separated UTF-8 text; its item scores are the node's point."""
+    _points: memoryview
+    _offsets: memoryview
+    _payload: memoryview
+
+    def __init__(self, points: memoryview, offsets: memoryview, payload: memoryview) -> None:
+        self._points = points
+        self._offsets = offsets
+        self._payload = payload
+
+    def __len__(self) -> int:
+        return len(self._offsets) - 1
+
+    def __getitem__(self, node: int) -> Apartment:
+        if not 0 <= node < len(self):
+            raise IndexError('node out of range')
+        year, owner, lat, lon, score = str(self._payload[self._offsets[node]:self._offsets[node + 1]], 'utf-8').split('\t')
+        c, m, h = self._points[3 * node:3 * node + 3]
+        return Apartment(year, owner, lat, lon, repr(c), repr(m), repr(h), score)
+
+    @staticmethod
+    def record(apt: Apartment) -> bytes:
+        """Return the payload record of <apt>."""
+        # Apartment stores its latitude as the longitude of its Location and vice versa
+        return f'{apt.year}\t{apt.owner}\t{apt.location.lon!r}\t{apt.location.lat!r}\t{apt.score!r}'.encode('utf-8')
+
+
 class KDTree:
     """A KDTree that stores information about Apartments.
-    It is made up of _KDTNode objects, and each _KDTNode object
-    contains apartment objects.
+    Its nodes are stored in flat arrays rather than as _KDTNode objects, in
+    preorder: node 0 is the root (if the tree is not empty), and a node's left
+    child, when it has one, directly follows it.
 
     === Attributes ===
-    _KDTreeRoot: The root of the KDTree.
+    _apartments: The Apartment stored at each node.
+    _points: The (cosmetic, moderate, high risk) scores of node i at positions 3i to 3i + 2.
+    _axes: The score each node splits on: 0 for cosmetic, 1 for moderate and 2 for high risk.
+             Its pivot is the node's own score on that axis.
+    _left: The left child of each node, or -1 if it has none.
+    _right: The right child of each node, or -1 if it has none.
     _average_build_year: The average year the apartments in the tree were built
+    _path: The file the tree was loaded from, or None if it was built in memory
+    _nodes_visited: The number of nodes the last call to get_closest_point visited
 
     """
-    _KDTreeRoot: _KDTNode  # the root of the KD tree
+    _apartments: list[Apartment]
+    _points: array  # of float64
+    _axes: array  # of int8
+    _left: array  # of int32
+    _right: array  # of int32
     _average_build_year: int
+    _path: Optional[str]
+    _nodes_visited: int
 
     def __init__(self, data: list[Apartment]) -> None:
         """Initialize a new KD Tree (KDTree) using the input data.
         If <KDTree> is None, the KDTree is empty.
         """
         # build the tree from the apartment list, starting at depth 0
-        self._KDTreeRoot = self.build_tree(data, 0)
+        self.build_tree(data, 0)
         self._average_build_year= self.calculate_year_average() #initialize
 
+    def save(self, path: str) -> None:
+        """Save the tree to the file at <path>. After a short header, the file holds the
+        nodes' points (float64), left and right children (int32), the offsets of each
+        node's apartment record in the payload (int64) and split axes (int8), in
+        machine byte order, followed by the payload of apartment records.
+        """
+        records = [_MappedApartments.record(apt) for apt in self._apartments]
+        offsets = array('q', [0])
+        for record in records:
+            offsets.append(offsets[-1] + len(record))
+        with open(path, 'wb') as f:
+            f.write(TREE_FILE_HEADER.pack(TREE_FILE_MAGIC, TREE_FILE_VERSION, len(records), offsets[-1],
+                                          self._average_build_year))
+            array('d', self._points).tofile(f)
+            array('i', self._left).tofile(f)
+            array('i', self._right).tofile(f)
+            offsets.tofile(f)
+            array('b', self._axes).tofile(f)
+            f.write(b''.join(records))
+
+    @staticmethod
+    def load(path: str) -> KDTree:
+        """Return the tree saved in the file at <path>.
+        The file is memory-mapped read-only and queries run straight against the mapping,
+        so no nodes are built, and processes that load the same file share one copy of it.
+        Apartments are only read from the file when a query returns them. Unlike
+        unpickling, loading a file never runs code from it, and its arrays are checked so
+        that a corrupt or malicious file raises ValueError rather than sending queries out
+        of range, round in circles or down shared subtrees. The checks run over whole
+        arrays at once, but they are still linear in the size of the tree, at about
+        0.3 s per million nodes; the rest of loading takes the same time for any tree.
+        kdtree.kdt holds the same tree as kdtree.pkl.
+        >>> tree = KDTree.load('kdtree.kdt')
+        >>> with open('kdtree.pkl', 'rb') as file: pickled = pickle.load(file)
+        >>> [str(a) for a in tree.k_nearest(2, 2, 2, 6)] == [str(a) for a in pickled.k_nearest(2, 2, 2, 6)]
+        True
+        """
+        tree = KDTree.__new__(KDTree)
+        tree._map(path)
+        return tree
+
+    def _map(self, path: str) -> None:
+        """Point the tree's arrays at the tree file at <path>, mapped into memory."""
+        with open(path, 'rb') as f:
+            mapping = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if len(mapping) < TREE_FILE_HEADER.size:
+            raise ValueError(f'{path} is not a KD-tree file')
+        magic, version, n, payload_size, average_build_year = TREE_FILE_HEADER.unpack_from(mapping)
+        if magic != TREE_FILE_MAGIC or version != TREE_FILE_VERSION:
+            raise ValueError(f'{path} is not a KD-tree file of version {TREE_FILE_VERSION}')
+        if n < 0 or payload_size < 0 or len(mapping) != TREE_FILE_HEADER.size + 41 * n + 8 + payload_size:
+            raise ValueError(f'{path} is truncated or corrupt')
+
+        view = memoryview(mapping)
+        start = TREE_FILE_HEADER.size
+        sections = []
+        for size, typecode in ((24 * n, 'd'), (4 * n, 'i'), (4 * n, 'i'), (8 * n + 8, 'q'), (n, 'b')):
+            sections.append(view[start:start + size].cast(typecode))
+            start += size
+        self._points, self._left, self._right, offsets, self._axes = sections
+        self._validate(path, n, payload_size, self._left, self._right, self._axes, offsets)
+        self._apartments = _MappedApartments(self._points, offsets, view[start:])
+        self._average_build_year = average_build_year
+        self._path = path
+        self._nodes_visited = 0
+
+    @staticmethod
+    def _validate(path: str, n: int, payload_size: int, left: memoryview, right: memoryview, axes: memoryview,
+                  offsets: memoryview) -> None:
+        """Raise ValueError unless the arrays read from the tree file at <path> describe a
+        well-formed tree. Every child index must be a node other than the root, and no node
+        may be the child of more than one node. Then every node reachable from the root is
+        reached by exactly one path, so searches cannot loop or visit a subtree twice."""
+        children = left.tolist() + right.tolist()
+        referenced = set(children)
+        referenced.discard(-1)
+        if len(referenced) != len(children) - children.count(-1):
+            raise ValueError(f'{path} has a node that is the child of more than one node')
+        if len(referenced) > 0 and (min(referenced) < 1 or max(referenced) >= n):
+            raise ValueError(f'{path} has a child index out of range')
+        if len(axes.tobytes().translate(None, bytes([0, 1, 2]))) > 0:
+            raise ValueError(f'{path} has a split axis other than 0, 1 or 2')
+        starts = offsets.tolist()
+        if starts[0] != 0 or starts[-1] != payload_size or starts != sorted(starts):
+            raise ValueError(f'{path} has payload offsets out of order or out of range')
+
+    def __getstate__(self) -> dict:
+        """Return the state to pickle. A tree loaded from a file is pickled as the path of
+        that file, so that worker processes map the same file rather than copying the tree."""
+        if self.__dict__.get('_path') is not None:
+            return {'_path': self._path}
+        return self.__dict__
+
+    def __setstate__(self, state: dict) -> None:
+        """Restore a pickled tree, converting one pickled in the old layout of
+        linked _KDTNode objects into flat arrays."""
+        if '_path' in state and len(state) == 1:
+            self._map(state['_path'])
+            return
+        root = state.pop('_KDTreeRoot', None)
+        self.__dict__.update(state)
+        if '_apartments' not in state:
+            self._clear()
+            stack = [(root, 0, -1, False)] if root is not None else []
+            while len(stack) > 0:
+                old, depth, parent, is_left = stack.pop()
+                node = self._new_node(old.apartment, old.apartment.score_subset, depth % 3)
+                if is_left:
+                    self._left[parent] = node
+                elif parent != -1:
+                    self._right[parent] = node
+                if old.right is not None:
+                    stack.append((old.right, depth + 1, node, False))
+                if old.left is not None:  # popped first, so the left subtree directly follows its parent
+                    stack.append((old.left, depth + 1, node, True))
+            if '_average_build_year' not in state:
+                self._average_build_year = self.calculate_year_average()
+
+    def __len__(self) -> int:
+        return len(self._apartments)
+
+    def _clear(self) -> None:
+        """Empty the arrays that hold the nodes of this tree."""
+        self._apartments = []
+        self._points = array('d')
+        self._axes = array('b')
+        self._left = array('i')
+        self._right = array('i')
+        self._path = None
+        self._nodes_visited = 0
+
+    def _new_node(self, apt: Apartment, point: tuple[float, float, float], axis: int) -> int:
+        """Append a node with no children, storing <apt> and splitting on <axis>, and return it."""
+        node = len(self._apartments)
+        self._apartments.append(apt)
+        self._points.extend(point)
+        self._axes.append(axis)
+        self._left.append(-1)
+        self._right.append(-1)
+        return node
+
     def calculate_year_average(self) -> int:
         """
         Calculate the average year of construction for the apartment buildings contained
         within the tree. Round your estimate to the nearest integer value.
-        You may want to write a recursive helper function for this!
-        >>> with open('kdtree.pkl', 'rb') as file: loaded_object = pickle.load(file)
+        An empty tree has an average of 0.
+        >>> loaded_object = KDTree.load('kdtree.kdt')
         >>> print(loaded_object.calculate_year_average())
         1971
         """
-        pass  # Replace this!
+        if len(self._apartments) == 0:
+            return 0
+        return round(sum(apt.year for apt in self._apartments) / len(self._apartments))
 
     def display_tree(self) -> None:
         """ Recursive method to DISPLAY (i.e. print to the console) a KDTREE.
         You may want to study this code in order to see how to write your own recursive
         HELPER methods. """
-        lines, *_ = self._display_helper(self._KDTreeRoot)
+        if len(self._apartments) == 0:
+            return
+        lines, *_ = self._display_helper(0)
         for line in lines:
             print(line)
 
-    def _display_helper(self, node: _KDTNode) -> tuple[list[str], int, int, int]:
+    def _display_helper(self, node: int) -> tuple[list[str], int, int, int]:
         """ Recursive helper method to DISPLAY a KDTREE."""
         # No child.
-        if node.right is None and node.left is None:
-            line = f'{round(float(node.apartment.get_cosmetic()), 2)},{round(float(node.apartment.get_mod_risk()), 2)},{round(float(node.apartment.get_high_risk()), 2)}'
+        if self._right[node] == -1 and self._left[node] == -1:
+            line = f'{round(float(self._apartments[node].get_cosmetic()), 2)},{round(float(self._apartments[node].get_mod_risk()), 2)},{round(float(self._apartments[node].get_high_risk()), 2)}'
             width = len(line)
             height = 1
             middle = width // 2
             return [line], width, height, middle
 
         # Only left child.
-        if node.right is None:
-            lines, n, p, x = self._display_helper(node.left)
-            s = f'{round(float(node.apartment.get_cosmetic()), 2)},{round(float(node.apartment.get_mod_risk()), 2)},{round(float(node.apartment.get_high_risk()), 2)}'
+        if self._right[node] == -1:
+            lines, n, p, x = self._display_helper(self._left[node])
+            s = f'{round(float(self._apartments[node].get_cosmetic()), 2)},{round(float(self._apartments[node].get_mod_risk()), 2)},{round(float(self._apartments[node].get_high_risk()), 2)}'
 
             u = len(s)
             first_line = (x + 1) * ' ' + (n - x - 1) * '_' + s
@@ -140,9 +345,9 @@ class KDTree:
             return [first_line, second_line] + shifted_lines, n + u, p + 2, n + u // 2
 
         # Only right child.
-        if node.left is None:
-            lines, n, p, x = self._display_helper(node.right)
-            s = f'{round(float(node.apartment.get_cosmetic()), 2)},{round(float(node.apartment.get_mod_risk()), 2)},{round(float(node.apartment.get_high_risk()), 2)}'
+        if self._left[node] == -1:
+            lines, n, p, x = self._display_helper(self._right[node])
+            s = f'{round(float(self._apartments[node].get_cosmetic()), 2)},{round(float(self._apartments[node].get_mod_risk()), 2)},{round(float(self._apartments[node].get_high_risk()), 2)}'
 
             u = len(s)
             first_line = s + x * '_' + (n - x) * ' '
@@ -151,9 +356,9 @@ class KDTree:
             return [first_line, second_line] + shifted_lines, n + u, p + 2, u // 2
 
         # Two children.
-        left, n, p, x = self._display_helper(node.left)
-        right, m, q, y = self._display_helper(node.right)
-        s = f'{round(float(node.apartment.get_cosmetic()), 2)},{round(float(node.apartment.get_mod_risk()), 2)},{round(float(node.apartment.get_high_risk()), 2)}'
+        left, n, p, x = self._display_helper(self._left[node])
+        right, m, q, y = self._display_helper(self._right[node])
+        s = f'{round(float(self._apartments[node].get_cosmetic()), 2)},{round(float(self._apartments[node].get_mod_risk()), 2)},{round(float(self._apartments[node].get_high_risk()), 2)}'
 
         u = len(s)
         first_line = (x + 1) * ' ' + (n - x - 1) * '_' + s + y * '_' + (m - y) * ' '
@@ -166,55 +371,288 @@ class KDTree:
         lines = [first_line, second_line] + [a + u * ' ' + b for a, b in zipped_lines]
         return lines, n + m + u, max(p, q) + 2, n + u // 2
 
-    def build_tree(self, data: list[Apartment], depth: int) -> Optional[_KDTNode]:
+    def build_tree(self, data: list[Apartment], depth: int) -> int:
         """Build a KDTree from the input data. Build the tree using the median
         of the data at each level of the tree. The depth of the tree is used to
         determine whether to split the data by the cosmetic, moderate or high risk
         score of the apartment. Split by cosmetic score if depth mod 3 is 0, and by
         moderate risk score if depth mod 3 is 1; otherwise split by high risk score.
-        Your implementation will be recursive.
+        The nodes replace any already in this tree, and the root is returned (-1 if
+        <data> is empty).
         >>> t = KDTree([Apartment( '1805','PRIVATE','43.65','-79.39','2.8','2.6','2.7','87' ) , Apartment( '1910','PRIVATE','43.65','-79.39','2.9','1.6','1.7','87' ), Apartment( '2010','PRIVATE','43.65','-79.39','2.0','2.0','2.0','87' )])
         >>> t.display_tree() # doctest: +NORMALIZE_WHITESPACE
               _____2.8,2.6,2.7_____
              |                     |
         2.0,2.0,2.0           2.9,1.6,1.7
         """
-        pass  # Replace this!
+        self._clear()
+        if len(data) == 0:
+            return -1
+
+        points = [apt.score_subset for apt in data]
+        columns = [[p[axis] for p in points] for axis in range(3)]
+        return self._build_sorted(data, points, columns, sorted(range(len(data)), key=columns[depth % 3].__getitem__), depth)
+
+    def _build_sorted(self, data: list[Apartment], points: list[tuple[float, float, float]], columns: list[list[float]],
+                      subset: list[int], depth: int) -> int:
+        """Build the subtree for the points at positions `subset`, which are already in the
+        order of the level at `depth`, and return its root. Each child's subset is stably
+        sorted on the axis of the level below, so ties keep the order of the parent's subset."""
+        axis = depth % 3
+        middle = len(subset) // 2
+        median = subset[middle]
+        node = self._new_node(data[median], points[median], axis)
+
+        key = columns[(depth + 1) % 3].__getitem__
+        if middle > 0:
+            self._left[node] = self._build_sorted(data, points, columns, sorted(subset[:middle], key=key), depth + 1)
+        if middle + 1 < len(subset):
+            self._right[node] = self._build_sorted(data, points, columns, sorted(subset[middle + 1:], key=key), depth + 1)
+        return node
 
     def lookup(self, c: float, m: float, h: float) -> bool:
         """Return True if there is a tree with the given coordinates is
         in the KDTree.  Otherwise return False.
-        >>> with open('kdtree.pkl', 'rb') as file: loaded_object = pickle.load(file)
+        >>> loaded_object = KDTree.load('kdtree.kdt')
         >>> print(loaded_object.lookup(1,1,1))
         False
         >>> print(loaded_object.lookup(2.7,2.8,2.7))
         True
         """
-        pass  # Replace this!
+        # Points equal to a node's pivot can be in either of its subtrees, so both are searched on a tie.
+        points, query = self._points, (c, m, h)
+        stack = [0] if len(self._apartments) > 0 else []
+        while len(stack) > 0:
+            node = stack.pop()
+            base = 3 * node
+            if points[base] == c and points[base + 1] == m and points[base + 2] == h:
+                return True
+            axis = self._axes[node]
+            value, pivot = query[axis], points[base + axis]
+            if value <= pivot and self._left[node] != -1:
+                stack.append(self._left[node])
+            if value >= pivot and self._right[node] != -1:
+                stack.append(self._right[node])
+        return False
 
     def get_closest_point(self, c: float, m: float, h: float) -> Optional[Apartment]:
         """ Return the nearest apartment to the given input set of coordinates
-        >>> with open('kdtree.pkl', 'rb') as file: loaded_object = pickle.load(file)
+        >>> loaded_object = KDTree.load('kdtree.kdt')
         >>> print(loaded_object.get_closest_point(2,2,2))
         At (-79.422, 43.687) and owned by SOCIAL HOUSING
         Item scores: (2.0, 2.6, 2.2) and overall score: 82.0
         >>> print(loaded_object.get_closest_point(3,3,3))
         At (-79.325, 43.663) and owned by SOCIAL HOUSING
         Item scores: (2.7, 2.8, 2.7) and overall score: 90.0
+        >>> loaded_object.nodes_visited <= len(loaded_object)
+        True
         """
-        pass  # Replace this!
+        # A branch-and-bound search on squared distances. Each stacked subtree carries the
+        # squared distance from the query to the subtree's cell on each axis (oc, om, oh),
+        # and their sum is a lower bound on the squared distance to any point in it. A
+        # subtree is skipped once the best point found so far is at least that close. The
+        # near side of each node is searched first, which finds a close point early.
+        points, axes, left, right = self._points, self._axes, self._left, self._right
+        query = (c, m, h)
+        best, best_distance = -1, math.inf
+        visited = 0
+        stack = [(0, 0.0, 0.0, 0.0, 0.0)] if len(self._apartments) > 0 else []
+        while len(stack) > 0:
+            node, bound, oc, om, oh = stack.pop()
+            if bound >= best_distance:
+                continue
+            visited += 1
+
+            base = 3 * node
+            dc, dm, dh = points[base] - c, points[base + 1] - m, points[base + 2] - h
+            distance = dc * dc + dm * dm + dh * dh
+            if distance < best_distance:
+                best, best_distance = node, distance
+
+            axis = axes[node]
+            offset = query[axis] - points[base + axis]
+            near, far = (left[node], right[node]) if offset < 0 else (right[node], left[node])
+            if far != -1:
+                plane = offset * offset
+                if axis == 0:
+                    far_bound = bound - oc + plane
+                    entry = (far, far_bound, plane, om, oh)
+                elif axis == 1:
+                    far_bound = bound - om + plane
+                    entry = (far, far_bound, oc, plane, oh)
+                else:
+                    far_bound = bound - oh + plane
+                    entry = (far, far_bound, oc, om, plane)
+                if far_bound < best_distance:
+                    stack.append(entry)
+            if near != -1:
+                stack.append((near, bound, oc, om, oh))
+
+        self._nodes_visited = visited
+        return self._apartments[best] if best != -1 else None
 
-    def predict(self, test_data: list[Apartment]) -> list[str]:
+    @property
+    def nodes_visited(self) -> int:
+        """The number of nodes the last call to get_closest_point visited."""
+        return self._nodes_visited
+
+    def k_nearest(self, c: float, m: float, h: float, k: int) -> list[Apartment]:
+        """Return the <k> apartments nearest to the given input set of coordinates, nearest
+        first, or every apartment in the tree if it holds fewer than <k>. Of several
+        apartments at the same distance, the search keeps the ones it meets first.
+        >>> loaded_object = KDTree.load('kdtree.kdt')
+        >>> [apt.owner for apt in loaded_object.k_nearest(2, 2, 2, 3)]
+        ['SOCIAL HOUSING', 'PRIVATE', 'TCHC']
+        >>> len(loaded_object.k_nearest(2, 2, 2, 10))
+        6
+        """
+        assert isinstance(k, int) and k > 0, "k must be a positive integer"
+        # The same branch-and-bound search as get_closest_point, pruned by the distance to
+        # the kth nearest apartment so far. <best> is a max-heap of (-distance, node).
+        points, axes, left, right = self._points, self._axes, self._left, self._right
+        query = (c, m, h)
+        best = []
+        stack = [(0, 0.0, (0.0, 0.0, 0.0))] if len(self._apartments) > 0 else []
+        while len(stack) > 0:
+            node, bound, offsets = stack.pop()
+            if len(best) == k and bound >= -best[0][0]:
+                continue
+
+            base = 3 * node
+            dc, dm, dh = points[base] - c, points[base + 1] - m, points[base + 2] - h
+            distance = dc * dc + dm * dm + dh * dh
+            if len(best) < k:
+                heappush(best, (-distance, node))
+            elif distance < -best[0][0]:
+                heappushpop(best, (-distance, node))
+
+            axis = axes[node]
+            offset = query[axis] - points[base + axis]
+            near, far = (left[node], right[node]) if offset < 0 else (right[node], left[node])
+            if far != -1:
+                plane = offset * offset
+                far_bound = bound - offsets[axis] + plane
+                if len(best) < k or far_bound < -best[0][0]:
+                    stack.append((far, far_bound, offsets[:axis] + (plane,) + offsets[axis + 1:]))
+            if near != -1:
+                stack.append((near, bound, offsets))
+
+        return [self._apartments[node] for _, node in sorted((-d, node) for d, node in best)]
+
+    def within_radius(self, c: float, m: float, h: float, r: float) -> list[Apartment]:
+        """Return every apartment within distance <r> of the given input set of coordinates,
+        nearest first.
+        >>> loaded_object = KDTree.load('kdtree.kdt')
+        >>> [apt.owner for apt in loaded_object.within_radius(2, 2, 2, 1)]
+        ['SOCIAL HOUSING', 'PRIVATE']
+        >>> loaded_object.within_radius(0, 0, 0, 1)
+        []
+        """
+        # Subtrees whose cells are all further than <r> from the point are skipped, using
+        # the same per-axis lower bounds on the squared distance as get_closest_point.
+        points, axes, left, right = self._points, self._axes, self._left, self._right
+        query, limit = (c, m, h), r * r
+        found = []
+        stack = [(0, 0.0, (0.0, 0.0, 0.0))] if len(self._apartments) > 0 and r >= 0 else []
+        while len(stack) > 0:
+            node, bound, offsets = stack.pop()
+
+            base = 3 * node
+            dc, dm, dh = points[base] - c, points[base + 1] - m, points[base + 2] - h
+            distance = dc * dc + dm * dm + dh * dh
+            if distance <= limit:
+                found.append((distance, node))
+
+            axis = axes[node]
+            offset = query[axis] - points[base + axis]
+            near, far = (left[node], right[node]) if offset < 0 else (right[node], left[node])
+            if far != -1:
+                plane = offset * offset
+                far_bound = bound - offsets[axis] + plane
+                if far_bound <= limit:
+                    stack.append((far, far_bound, offsets[:axis] + (plane,) + offsets[axis + 1:]))
+            if near != -1:
+                stack.append((near, bound, offsets))
+
+        found.sort()
+        return [self._apartments[node] for _, node in found]
+
+    def predict(self, test_data: list[Apartment], workers: int = 1, chunk_size: int = PREDICT_CHUNK_SIZE) -> list[str]:
         """ Classify each apartment building in the input list test_data as being either `SOCIAL HOUSING'
         `TCHC' or `PRIVATE'. Make classifications by finding the nearest apartment
         in the tree to the (cosmetic, moderate and high risk assessments) of each input
         apartment in test_data.  Classifications should be stored in a list of strings that is returned.
-        >>> with open('kdtree.pkl', 'rb') as file: loaded_object = pickle.load(file)
+        >>> loaded_object = KDTree.load('kdtree.kdt')
         >>> apt_list = [Apartment( '1805','PRIVATE','43.65','-79.39','2.8','2.6','2.7','87' )]
         >>> loaded_object.predict(apt_list)
         ['SOCIAL HOUSING']
+
+        The queries are classified in a batch: their scores are gathered into one array
+        and sorted, so that neighbouring queries walk the same part of the tree and
+        repeated scores are only searched once. With <workers> greater than 1, the
+        sorted queries are split into chunks of <chunk_size> and classified across that
+        many worker processes, which share this tree read-only. The classifications do
+        not depend on the number of workers.
+        >>> test_data = ApartmentReader.read_apartments('apartment-data/testing-2026.csv')
+        >>> loaded_object.predict(test_data, workers=2, chunk_size=500) == loaded_object.predict(test_data)
+        True
+
+        An empty tree cannot classify anything, so it raises ValueError unless <test_data>
+        is empty too.
+        >>> KDTree([]).predict([])
+        []
         """
-        pass  # Replace this!
+        if len(test_data) == 0:
+            return []
+        if len(self._apartments) == 0:
+            raise ValueError('cannot classify apartments with an empty KDTree')
+        points = [apt.score_subset for apt in test_data]
+        order = sorted(range(len(points)), key=points.__getitem__)
+        chunks = []
+        for start in range(0, len(order), chunk_size):
+            chunk = array('d')
+            for i in order[start:start + chunk_size]:
+                chunk.extend(points[i])
+            chunks.append(chunk)
+
+        if workers <= 1:
+            owners = [self._predict_points(chunk) for chunk in chunks]
+        else:
+            try:
+                with self._worker_pool(workers) as executor:
+                    owners = list(executor.map(_predict_chunk, chunks))
+            finally:
+                _set_worker_tree(None)
+
+        predictions = [''] * len(points)
+        for start, chunk_owners in zip(range(0, len(order), chunk_size), owners):
+            for i, owner in zip(order[start:start + chunk_size], chunk_owners):
+                predictions[i] = owner
+        return predictions
+
+    def _predict_points(self, queries: array) -> list[str]:
+        """Return the owner of the nearest apartment to each point in <queries>, which
+        holds the (cosmetic, moderate, high risk) scores of each point in turn. A point
+        equal to the one before it reuses its answer."""
+        owners = []
+        previous, owner = None, None
+        for i in range(0, len(queries), 3):
+            point = (queries[i], queries[i + 1], queries[i + 2])
+            if point != previous:
+                owner = self.get_closest_point(*point).owner
+                previous = point
+            owners.append(owner)
+        return owners
+
+    def _worker_pool(self, workers: int) -> ProcessPoolExecutor:
+        """Return a pool of <workers> processes that can each classify queries with this
+        tree. Where processes are forked, the workers inherit the tree's arrays from this
+        process without copying them; otherwise the tree is sent to each worker once."""
+        global _worker_tree
+        if 'fork' in multiprocessing.get_all_start_methods():
+            _worker_tree = self
+            return ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('fork'))
+        return ProcessPoolExecutor(max_workers=workers, initializer=_set_worker_tree, initargs=(self,))
 
     @staticmethod
     def arg_sort(seq: list[int]) -> list[int]:
@@ -226,7 +664,16 @@ class KDTree:
         >>> KDTree.arg_sort([8, 6, 7, 5, 3, 0, 9])
         [5, 4, 3, 1, 2, 0, 6]
         """
-        pass  # Replace this!
+        return sorted(range(len(seq)), key=seq.__getitem__)
+
+def _set_worker_tree(tree: KDTree) -> None:
+    """Remember the tree this worker process will use to classify chunks of queries."""
+    global _worker_tree
+    _worker_tree = tree
+
+def _predict_chunk(queries: array) -> list[str]:
+    """Return the worker's tree's classification of each point in one chunk of queries."""
+    return _worker_tree._predict_points(queries)
 
 def get_ground_truth(apartments: list[Apartment]) -> list[str]:
     """
@@ -250,9 +697,8 @@ def calculate_accuracy(predictions: list[str], truth: list[str]) -> int:
 if __name__ == '__main__':
 
     # print("Below is an example of a KD Tree:")
-    with open('kdtree.pkl', 'rb') as file:
-        loaded_object = pickle.load(file)
-        loaded_object.display_tree()
+    loaded_object = KDTree.load('kdtree.kdt')
+    loaded_object.display_tree()
 
     # Once you write code to build your own KD Tree,
     # you can test it using the doctests below.